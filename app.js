@@ -20,6 +20,7 @@ const dataTableContainer = document.getElementById('data-table-container');
 const downloadExcelBtn = document.getElementById('download-excel-btn');
 const downloadSinglePdfBtn = document.getElementById('download-single-pdf-btn');
 const downloadPdfsBtn = document.getElementById('download-pdfs-btn');
+const downloadAllBtn = document.getElementById('download-all-btn');
 const startOverBtn = document.getElementById('start-over-btn');
 
 const apiUrl = (path) => `${API_BASE}${path.startsWith("/") ? "" : "/"}${path}`;
@@ -48,6 +49,7 @@ processBtn.addEventListener('click', processFiles);
 downloadExcelBtn.addEventListener('click', downloadExcel);
 downloadSinglePdfBtn.addEventListener('click', downloadSinglePDF);
 downloadPdfsBtn.addEventListener('click', downloadPDFs);
+downloadAllBtn.addEventListener('click', downloadAll);
 startOverBtn.addEventListener('click', startOver);
 
 console.log('Dec Filler initialized successfully');
@@ -177,7 +179,7 @@ async function processFiles() {
         const controller = new AbortController();
         const timeoutId = setTimeout(() => controller.abort(), 180000); // 3 minutes
 
-        const response = await fetch(apiUrl('/api/upload'), {
+        const response = await fetch(apiUrl('/api/upload?format=columnar'), {
             method: 'POST',
             body: formData,
             signal: controller.signal
@@ -192,9 +194,21 @@ async function processFiles() {
 
         const result = await response.json();
 
-        // Store extracted data with thumbnails
-        extractedData = result.results
-            .filter(r => r.status === 'success')
+        // Extracted data comes back once as a columnar batch; attach each row to its result
+        const rows = result.batch ? decodeBatch(result.batch) : [];
+        result.results.forEach(r => {
+            if (r.row !== undefined) {
+                r.data = rows[r.row];
+            }
+        });
+
+        // Store extracted data with thumbnails, merging vehicles uploaded twice in this batch
+        const successful = result.results.filter(r => r.status === 'success');
+        const batchDuplicates = successful.filter(r => r.duplicate && r.duplicate.in_batch);
+        const previouslyUploaded = successful.filter(r => r.duplicate && !r.duplicate.in_batch);
+
+        extractedData = successful
+            .filter(r => !(r.duplicate && r.duplicate.in_batch))
             .map(r => ({
                 ...r.data,
                 thumbnail: r.thumbnail
@@ -212,7 +226,14 @@ async function processFiles() {
         reviewSection.style.display = 'block';
         downloadSection.style.display = 'block';
 
-        showMessage(`Successfully processed ${extractedData.length} of ${selectedFiles.length} files.`, 'success');
+        let summary = `Successfully processed ${extractedData.length} of ${selectedFiles.length} files.`;
+        if (batchDuplicates.length > 0) {
+            summary += ` Merged ${batchDuplicates.length} duplicate upload(s) of the same vehicle.`;
+        }
+        if (previouslyUploaded.length > 0) {
+            summary += ` ${previouslyUploaded.length} vehicle(s) were uploaded before.`;
+        }
+        showMessage(summary, 'success');
 
     } catch (error) {
         hideProgress();
@@ -420,22 +441,108 @@ function updateData(rowIndex, field, value) {
         if (input && input.value !== value) {
             input.value = value;
         }
+
+        // Let the server re-derive fields that depend on this one
+        if (REPARSE_FIELDS.includes(field)) {
+            reparseField(rowIndex, field, value);
+        }
     }
 }
 
-// Download Functions
-async function downloadExcel() {
-    showProgress('Generating Excel file...');
+// Fields whose edits are re-validated by the server's parser
+const REPARSE_FIELDS = ['vin', 'engine_no'];
+
+async function reparseField(rowIndex, field, value) {
+    const row = extractedData[rowIndex];
+    const { thumbnail, ...current } = row;
 
     try {
-        const response = await fetch(apiUrl('/api/generate-excel'), {
+        const response = await fetch(apiUrl('/api/reparse'), {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({ data: extractedData })
+            body: JSON.stringify({ record_id: row.record_id, data: current, edits: { [field]: value } })
+        });
+
+        if (!response.ok) return;
+
+        const result = await response.json();
+        Object.entries(result.changed || {}).forEach(([changedField, changedValue]) => {
+            row[changedField] = changedValue;
+            const input = document.querySelector(`input[data-row="${rowIndex}"][data-field="${changedField}"]`);
+            if (input) {
+                input.value = changedValue;
+            }
         });
 
+        // Flag VINs that still fail validation
+        const vinInput = document.querySelector(`input[data-row="${rowIndex}"][data-field="vin"]`);
+        if (vinInput) {
+            vinInput.title = row.vin_warning || '';
+            vinInput.classList.toggle('missing-data', !row.vin || Boolean(row.vin_warning));
+        }
+    } catch (error) {
+        console.error('Reparse failed:', error);
+    }
+}
+
+// Compact batch format (see server/records.py): field names once, one array per field
+const CLIENT_ONLY_FIELDS = ['thumbnail', 'ocr_text'];
+
+function encodeBatch(rows) {
+    const fields = [];
+    rows.forEach(row => {
+        Object.entries(row).forEach(([field, value]) => {
+            if (!CLIENT_ONLY_FIELDS.includes(field) && !fields.includes(field) &&
+                value !== null && value !== undefined && value !== '') {
+                fields.push(field);
+            }
+        });
+    });
+
+    return {
+        format: 'columnar',
+        version: 1,
+        count: rows.length,
+        fields,
+        columns: fields.map(field => rows.map(row => row[field] ?? null))
+    };
+}
+
+function decodeBatch(batch) {
+    const rows = Array.from({ length: batch.count }, () => ({}));
+    batch.fields.forEach((field, i) => {
+        batch.columns[i].forEach((value, rowIndex) => {
+            if (value !== null) {
+                rows[rowIndex][field] = value;
+            }
+        });
+    });
+    return rows;
+}
+
+// Request options for sending rows to a generate endpoint, gzipped where the browser supports it
+async function batchRequest(rows) {
+    const json = JSON.stringify({ batch: encodeBatch(rows) });
+    const headers = { 'Content-Type': 'application/json' };
+
+    if (typeof CompressionStream === 'undefined') {
+        return { method: 'POST', headers, body: json };
+    }
+
+    const stream = new Blob([json]).stream().pipeThrough(new CompressionStream('gzip'));
+    const body = await new Response(stream).blob();
+    return { method: 'POST', headers: { ...headers, 'Content-Encoding': 'gzip' }, body };
+}
+
+// Download Functions
+async function downloadExcel() {
+    showProgress('Generating Excel file...');
+
+    try {
+        const response = await fetch(apiUrl('/api/generate-excel'), await batchRequest(extractedData));
+
         if (!response.ok) {
             throw new Error('Excel generation failed');
         }
@@ -463,13 +570,7 @@ async function downloadSinglePDF() {
     showProgress('Generating single multi-page PDF...');
 
     try {
-        const response = await fetch(apiUrl('/api/generate-single-pdf'), {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ data: extractedData })
-        });
+        const response = await fetch(apiUrl('/api/generate-single-pdf'), await batchRequest(extractedData));
 
         if (!response.ok) {
             throw new Error('Single PDF generation failed');
@@ -498,13 +599,7 @@ async function downloadPDFs() {
     showProgress('Generating filled PDF declarations...');
 
     try {
-        const response = await fetch(apiUrl('/api/generate-pdfs'), {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ data: extractedData })
-        });
+        const response = await fetch(apiUrl('/api/generate-pdfs'), await batchRequest(extractedData));
 
         if (!response.ok) {
             throw new Error('PDF generation failed');
@@ -529,6 +624,35 @@ async function downloadPDFs() {
     }
 }
 
+async function downloadAll() {
+    showProgress('Generating PDF, Excel and individual declarations...');
+
+    try {
+        const response = await fetch(apiUrl('/api/generate-bundle'), await batchRequest(extractedData));
+
+        if (!response.ok) {
+            throw new Error('Bundle generation failed');
+        }
+
+        const blob = await response.blob();
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.href = url;
+        a.download = `declarations_bundle_${Date.now()}.zip`;
+        document.body.appendChild(a);
+        a.click();
+        window.URL.revokeObjectURL(url);
+        document.body.removeChild(a);
+
+        hideProgress();
+        showMessage('All downloads generated successfully!', 'success');
+
+    } catch (error) {
+        hideProgress();
+        showMessage('Error generating downloads: ' + error.message, 'error');
+    }
+}
+
 // UI Helpers
 let progressInterval = null;
 
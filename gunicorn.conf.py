@@ -0,0 +1,49 @@
+"""
+Gunicorn configuration
+Loads the app once in the master and warms it up before workers fork
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+
+# Worker processes and threads per worker; OCR concurrency inside each worker
+# is capped separately by OCR_POOL_SIZE (see server/config.py)
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+# Increased timeout to 300s for OCR processing multiple files
+timeout = 300
+# A recycled worker finishes its in-flight uploads first
+graceful_timeout = timeout
+
+# Restart each worker after this many requests (0 = never; small profile: 500). Python seldom
+# returns memory after a large upload, so without recycling a worker that crossed
+# MEMORY_SOFT_LIMIT_MB could answer 503 until restarted. Preloading makes the restart a cheap fork
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS',
+                                  '500' if os.environ.get('RESOURCE_PROFILE') == 'small' else '0'))
+max_requests_jitter = max_requests // 10
+loglevel = 'info'
+accesslog = '-'
+errorlog = '-'
+
+# Downloads are built in SpooledTemporaryFile buffers that stay in memory up to
+# RESPONSE_SPOOL_MAX_MB; sendfile() would ask for their fileno() and roll each one
+# over to disk, so responses are written from the buffer instead
+sendfile = False
+
+# Import server.app in the master so templates, fonts and libraries are
+# loaded once and shared with workers through fork
+preload_app = True
+
+
+def when_ready(server):
+    """Warm up the preloaded app before the first worker is forked"""
+    from server.app import warm_up
+    from server.config import WARMUP_OCR
+    warm_up(run_ocr=WARMUP_OCR)
+
+
+def post_fork(server, worker):
+    """Give each worker its own locks and pools"""
+    from server.app import init_worker
+    init_worker()
@@ -3,45 +3,194 @@ Flask Backend Server
 Handles file uploads, OCR processing, and PDF generation
 """
 
+import time
+
+# Measured from here so the reported startup time covers importing the app
+PROCESS_STARTED_AT = time.time()
+
 from flask import Flask, request, jsonify, send_file, send_from_directory
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
 import json
-import shutil
+import tempfile
+import uuid
 import zipfile
 from datetime import datetime
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill
 import base64
 from io import BytesIO
-from PIL import Image
 
 from server.ocr_processor import OCRProcessor
 from server.data_parser import DataParser
 from server.pdf_filler import PDFFiller
-
-app = Flask(__name__, static_folder='..', static_url_path='')
+from server.health import HealthMonitor
+from server.janitor import FileJanitor
+from server.store import ExtractionStore
+from server.dedup import dedupe_records, vehicle_key
+from server.pipeline import ExtractionPipeline
+from server.scheduler import FairScheduler, SchedulerFull
+from server.governor import MemoryGovernor, MemoryPressure
+from server.excel_writer import InspectionWorkbook
+from server.templates import DEFAULT_TEMPLATE, TemplateRegistry
+from server.records import VehicleRecord, encode_batch, decode_batch, decode_body, compress_json
+from server.config import (BASE_DIR, UPLOAD_FOLDER, OUTPUT_FOLDER, TEMP_FOLDER, TEMPLATE_PDF,
+                           OCR_POOL_SIZE, WARMUP_OCR, UPLOAD_TTL_SECONDS, TEMP_TTL_SECONDS,
+                           OUTPUT_TTL_SECONDS, DISK_CEILING_MB, JANITOR_INTERVAL_SECONDS,
+                           RESPONSE_SPOOL_MAX_BYTES, DATA_FOLDER, EXTRACTION_DB_PATH,
+                           RENDER_WORKERS, REQUEST_BODY_MAX_BYTES, GZIP_MIN_BYTES,
+                           TEMPLATES_FOLDER, DEFAULT_TEMPLATE_NAME, MAX_CLIENT_OCR_JOBS, MAX_TOTAL_OCR_JOBS,
+                           SMALL_JOB_FILES, OCR_MAX_PAGES, OCR_STOP_AT_VEHICLE_BLOCK, OCR_DPI, OCR_MAX_IMAGE_PIXELS, THUMBNAIL_MAX_PX,
+                           RESOURCE_PROFILE, MEMORY_SOFT_LIMIT_BYTES, MEMORY_WAIT_SECONDS, PAGE_BUFFER_FOLDER,
+                           MAX_REQUEST_RECORDS, TRUSTED_PROXY_HOPS)
+
+# Only the frontend files are served; the project root also holds uploads, output and the database
+app = Flask(__name__, static_folder=None)
 CORS(app)
 
-# Configuration
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
-OUTPUT_FOLDER = os.path.join(BASE_DIR, 'output')
-TEMP_FOLDER = os.path.join(BASE_DIR, 'temp')
-TEMPLATE_PDF = os.path.join(BASE_DIR, 'Target.pdf')
-
 # Create folders if they don't exist
-for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER, TEMP_FOLDER]:
+for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER, TEMP_FOLDER, PAGE_BUFFER_FOLDER, DATA_FOLDER]:
     os.makedirs(folder, exist_ok=True)
 
 # Allowed file extensions
-ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'tiff', 'bmp'}
+ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'tiff', 'tif', 'bmp'}
+
+# Files in the project root served to the browser
+FRONTEND_FILES = {'index.html', 'app.js', 'styles.css', 'favicon.ico'}
 
 # Initialize processors
-ocr_processor = OCRProcessor()
+# These hold no per-request state, so each worker process (and each thread in it)
+# can share its own copy; anything mutable per worker is set up in init_worker()
+ocr_processor = OCRProcessor(max_pages=OCR_MAX_PAGES, stop_at_vehicle_block=OCR_STOP_AT_VEHICLE_BLOCK,
+                             dpi=OCR_DPI, max_image_pixels=OCR_MAX_IMAGE_PIXELS)
 data_parser = DataParser()
-pdf_filler = PDFFiller(TEMPLATE_PDF)
+
+# Every declaration template is loaded into this one process; records pick theirs by name
+template_registry = TemplateRegistry(DEFAULT_TEMPLATE_NAME)
+template_registry.register(DEFAULT_TEMPLATE, TEMPLATE_PDF, label='Declaration and Contract of Sale')
+template_registry.load_folder(TEMPLATES_FOLDER)
+pdf_filler = PDFFiller(registry=template_registry)
+
+# Parsed uploads, so declarations can be regenerated by record id without OCR
+extraction_store = ExtractionStore(EXTRACTION_DB_PATH)
+
+# New OCR and rendering work waits while this worker is close to its memory limit
+# (reset per worker after fork)
+memory_governor = MemoryGovernor(MEMORY_SOFT_LIMIT_BYTES, max_wait=MEMORY_WAIT_SECONDS)
+
+# Hash -> duplicate lookup -> OCR -> parse -> store, shared with the batch CLI;
+# limits concurrent Tesseract jobs in this worker (reset per worker after fork)
+extraction_pipeline = ExtractionPipeline(ocr_processor, data_parser, extraction_store,
+                                         ocr_slots=OCR_POOL_SIZE, verbose=True, governor=memory_governor)
+
+# Upload OCR takes turns per client under the same per-worker limit; full queues
+# answer 429 instead of piling up (reset per worker after fork)
+ocr_scheduler = FairScheduler(OCR_POOL_SIZE, max_client_jobs=MAX_CLIENT_OCR_JOBS,
+                              max_total_jobs=MAX_TOTAL_OCR_JOBS, small_job_files=SMALL_JOB_FILES)
+
+# Probe Tesseract/Poppler once at startup; /api/health only reads the cached result
+health_monitor = HealthMonitor(TEMPLATE_PDF)
+health_monitor.probe_capabilities()
+
+# Expires old uploads, temp files and generated output off the request path;
+# started per worker in init_worker(), and the worker holding the lock file sweeps for all
+janitor = FileJanitor(
+    {
+        UPLOAD_FOLDER: UPLOAD_TTL_SECONDS,
+        TEMP_FOLDER: TEMP_TTL_SECONDS,
+        # Page rasters are deleted after OCR; this catches ones left by a crashed worker
+        PAGE_BUFFER_FOLDER: TEMP_TTL_SECONDS,
+        OUTPUT_FOLDER: OUTPUT_TTL_SECONDS
+    },
+    max_disk_bytes=DISK_CEILING_MB * 1024 * 1024,
+    interval=JANITOR_INTERVAL_SECONDS,
+    lock_path=os.path.join(DATA_FOLDER, 'janitor.lock')
+)
+
+# Startup timings reported by /api/health (milliseconds)
+startup_timings = {
+    'import_ms': round((time.time() - PROCESS_STARTED_AT) * 1000, 1),
+    'warmup_ms': None,
+    'first_response_ms': None
+}
+
+
+def warm_up(run_ocr=False):
+    """
+    Preload heavy libraries, the template and fonts before serving requests
+
+    Under gunicorn this runs once in the master (preload_app), so forked workers
+    inherit everything already loaded.
+
+    Args:
+        run_ocr: Also run one real OCR so the first upload skips Tesseract start-up cost
+    """
+    started = time.time()
+
+    # Heavy imports deferred from module import time
+    import openpyxl
+    import pytesseract
+    import pdf2image
+    from PIL import Image, ImageOps
+
+    try:
+        pdf_filler.preload()
+    except Exception as e:
+        print(f"Error preloading template: {e}", flush=True)
+
+    if run_ocr:
+        readiness = health_monitor.readiness()
+        print(f"Warm-up OCR ready={readiness.get('ready')} in {readiness.get('duration_ms')}ms", flush=True)
+
+    startup_timings['warmup_ms'] = round((time.time() - started) * 1000, 1)
+    print(f"Warm-up finished in {startup_timings['warmup_ms']}ms", flush=True)
+
+
+def init_worker():
+    """
+    Reset per-process state after a gunicorn worker forks from the master
+
+    Locks and semaphores copied from the master are replaced so no worker
+    inherits state from another process.
+    """
+    extraction_pipeline.reset_locks()
+    ocr_scheduler.reset_locks()
+    memory_governor.reset_locks()
+    pdf_filler.reset_locks()
+    health_monitor.reset_locks()
+    janitor.start()
+    print(f"Worker {os.getpid()} ready (OCR pool size {OCR_POOL_SIZE}, {RESOURCE_PROFILE} profile)", flush=True)
+
+
+def unique_token():
+    """Return a timestamped token that is unique across workers and threads"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+
+@app.after_request
+def record_first_response(response):
+    """Record time from process start to the first response, once"""
+    if startup_timings['first_response_ms'] is None:
+        startup_timings['first_response_ms'] = round((time.time() - PROCESS_STARTED_AT) * 1000, 1)
+        print(f"Time to first response: {startup_timings['first_response_ms']}ms", flush=True)
+    return response
+
+
+@app.after_request
+def gzip_json_response(response):
+    """Gzip large JSON responses (upload results, record searches) when the client accepts it"""
+    if (response.mimetype != 'application/json' or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()):
+        return response
+
+    body = response.get_data()
+    if len(body) < GZIP_MIN_BYTES:
+        return response
+
+    response.set_data(compress_json(body))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
 
 
 def allowed_file(filename):
@@ -49,37 +198,121 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def cleanup_old_files():
-    """Clean up old upload and temp files"""
-    for folder in [UPLOAD_FOLDER, TEMP_FOLDER]:
-        for filename in os.listdir(folder):
-            file_path = os.path.join(folder, filename)
-            try:
-                if os.path.isfile(file_path):
-                    # Delete files older than 1 hour
-                    if os.path.getmtime(file_path) < (datetime.now().timestamp() - 3600):
-                        os.unlink(file_path)
-            except Exception as e:
-                print(f"Error deleting {file_path}: {e}")
+def read_payload():
+    """
+    Parse the JSON request body, which may be gzip/deflate/br compressed
+
+    Returns:
+        Parsed JSON dictionary (empty if there is no body)
+
+    Raises:
+        ValueError: If the body cannot be decoded
+    """
+    payload = decode_body(request.get_data(cache=True), request.headers.get('Content-Encoding'),
+                          REQUEST_BODY_MAX_BYTES)
+    return payload if isinstance(payload, dict) else {}
 
 
-def generate_thumbnail(file_path, max_size=(400, 400)):
+def load_data_list(payload=None):
+    """
+    Resolve the records a generate endpoint should render
+
+    The request body may carry full records in 'data' (a list of dictionaries),
+    in 'batch' (the columnar format from records.encode_batch()), stored record
+    ids in 'record_ids', or any mix. Items that have a 'record_id' are loaded
+    from the store and any other keys in the item override the stored values
+    (e.g. a seller_name typed in the browser). A top-level 'template' picks the
+    declaration template for records that don't name their own. Later records
+    for a vehicle already in the list (same VIN or MTA) are dropped, so every
+    download holds one declaration per vehicle.
+
+    Args:
+        payload: Parsed request body (read from the current Flask request if omitted)
+
+    Returns:
+        List of VehicleRecords
+
+    Raises:
+        LookupError: If a record id does not exist
+        ValueError: If the body or batch cannot be decoded, names more than MAX_REQUEST_RECORDS
+            records, or a template is unknown
+    """
+    if payload is None:
+        payload = read_payload()
+    items = payload.get('data', [])
+    record_ids = payload.get('record_ids', [])
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ValueError("'data' must be a list of objects")
+    if not isinstance(record_ids, list):
+        raise ValueError("'record_ids' must be a list")
+    items = list(items)
+    if len(items) + len(record_ids) > MAX_REQUEST_RECORDS:
+        raise ValueError(f'At most {MAX_REQUEST_RECORDS} records are accepted per request')
+    if payload.get('batch'):
+        items.extend(decode_batch(payload['batch'], MAX_REQUEST_RECORDS - len(items) - len(record_ids)))
+    items.extend({'record_id': record_id} for record_id in record_ids)
+
+    ids = [item['record_id'] for item in items if item.get('record_id') is not None]
+    if not all((isinstance(record_id, int) and not isinstance(record_id, bool))
+               or (isinstance(record_id, str) and record_id.isdigit()) for record_id in ids):
+        raise ValueError('Record ids must be integers')
+    stored = dict(zip(ids, extraction_store.get_many(ids)))
+
+    data_list = []
+    for item in items:
+        record_id = item.get('record_id')
+        if record_id is None:
+            data_list.append(VehicleRecord.from_dict(item))
+            continue
+        if stored.get(record_id) is None:
+            raise LookupError(f"Unknown record id: {record_id}")
+        data_list.append(VehicleRecord.from_dict({**stored[record_id], **item}))
+    data_list = dedupe_records(data_list)
+
+    template = payload.get('template')
+    for data in data_list:
+        if template and not data.get('template'):
+            data.extra['template'] = template
+        # Reject unknown template names before any rendering starts
+        pdf_filler.template_for(data)
+
+    return data_list
+
+
+def spooled_buffer():
+    """Return a buffer that stays in memory until it outgrows RESPONSE_SPOOL_MAX_BYTES"""
+    return tempfile.SpooledTemporaryFile(max_size=RESPONSE_SPOOL_MAX_BYTES, dir=TEMP_FOLDER)
+
+
+def send_buffer(buffer, download_name, mimetype):
+    """Rewind a spooled buffer and stream it to the client"""
+    buffer.seek(0)
+    return send_file(buffer, mimetype=mimetype, as_attachment=True, download_name=download_name)
+
+
+def generate_thumbnail(file_path, max_size=(THUMBNAIL_MAX_PX, THUMBNAIL_MAX_PX)):
     """Generate a base64-encoded thumbnail for preview"""
+    from PIL import Image, ImageOps
+
     try:
-        # Handle PDFs - convert first page to image
+        # Handle PDFs - convert first page to image, rasterized at thumbnail height
+        # rather than shrinking a full-resolution page
         if file_path.lower().endswith('.pdf'):
             from pdf2image import convert_from_path
-            images = convert_from_path(file_path, first_page=1, last_page=1)
+            images = convert_from_path(file_path, first_page=1, last_page=1, size=(None, max_size[1]))
             image = images[0] if images else None
         else:
-            # Handle images
+            # Handle images (JPEGs are decoded at reduced size where possible)
             image = Image.open(file_path)
+            try:
+                image.draft('RGB', max_size)
+            except Exception:
+                pass
 
         if image is None:
             return None
 
         # Auto-orient image based on EXIF data (fixes sideways phone photos)
-        from PIL import ImageOps
         try:
             image = ImageOps.exif_transpose(image)
         except:
@@ -109,10 +342,217 @@ def generate_thumbnail(file_path, max_size=(400, 400)):
         return None
 
 
+def upload_path(filename):
+    """Return a unique path in UPLOAD_FOLDER for an uploaded file"""
+    return os.path.join(UPLOAD_FOLDER, f"{unique_token()}_{filename}")
+
+
+def client_id(headers, remote_addr):
+    """
+    Identify the client an upload is queued under
+
+    Only X-Forwarded-For entries appended by the TRUSTED_PROXY_HOPS proxies in
+    front of the app count; anything earlier in the header came from the
+    client and could change on every request. Without them, the peer address.
+    """
+    hops = [hop.strip() for hop in headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+    if TRUSTED_PROXY_HOPS and len(hops) >= TRUSTED_PROXY_HOPS:
+        return hops[-TRUSTED_PROXY_HOPS]
+    return remote_addr or 'unknown'
+
+
+def admit_upload(files, headers, remote_addr):
+    """
+    Reserve OCR queue space for the files of one upload
+
+    Raises:
+        SchedulerFull: If the client or the server already has too much queued
+    """
+    jobs = sum(1 for file in files if file and allowed_file(file.filename))
+    return ocr_scheduler.admit(client_id(headers, remote_addr), jobs)
+
+
+def busy_body(error):
+    """Body of the 429 response for a refused upload"""
+    return {'error': f"{error} - try again in {error.retry_after} seconds", 'retry_after': error.retry_after}
+
+
+def extract_upload(file_path, filename, slot=None, found=None):
+    """
+    Process one saved upload: OCR (or reuse), parse, store and thumbnail
+
+    Args:
+        file_path: Path of the saved upload
+        filename: Original (sanitized) filename
+        slot: Context manager held while OCR runs (see ExtractionPipeline.recognize)
+        found: ExtractionPipeline.lookup() result, if already known
+
+    Returns:
+        Result dictionary for the upload response
+    """
+    try:
+        extraction = extraction_pipeline.extract(file_path, filename, slot, found)
+        extracted_data = extraction['data']
+        extracted_data['ocr_text'] = extraction['ocr_text'][:500]  # Include first 500 chars for debugging
+
+        # Generate thumbnail for preview
+        thumbnail = generate_thumbnail(file_path)
+
+        return {
+            'filename': filename,
+            'status': 'success',
+            'data': extracted_data,
+            'thumbnail': thumbnail,
+            'duplicate': extraction['duplicate']
+        }
+
+    except MemoryPressure:
+        # Ends the whole upload with 503; files already done are reused on retry
+        raise
+    except Exception as e:
+        return {
+            'filename': filename,
+            'status': 'error',
+            'error': str(e)
+        }
+
+
+def flag_batch_duplicates(results):
+    """Flag later uploads of a vehicle seen earlier in the same request so the client can merge them"""
+    # Vehicle key -> filename of the first upload of that vehicle in this request
+    batch_vehicles = {}
+    for result in results:
+        if result['status'] != 'success':
+            continue
+        key = vehicle_key(result['data'])
+        duplicate = result['duplicate']
+        if key in batch_vehicles:
+            result['duplicate'] = {**(duplicate or {}), 'match': duplicate['match'] if duplicate else key[0],
+                                   'in_batch': True, 'first_filename': batch_vehicles[key]}
+        elif key is not None:
+            batch_vehicles[key] = result['filename']
+
+
+def upload_response(results, columnar=False):
+    """
+    Build the /api/upload response body
+
+    Args:
+        results: Per-file results from extract_upload()
+        columnar: Return extracted data as one columnar 'batch' (each result gets its 'row')
+
+    Returns:
+        Response dictionary
+    """
+    if columnar:
+        rows = []
+        for result in results:
+            if result['status'] == 'success':
+                result['row'] = len(rows)
+                rows.append(result.pop('data'))
+        return {
+            'status': 'success',
+            'results': results,
+            # Keep the OCR excerpt shown for debugging in the browser
+            'batch': encode_batch(rows, exclude=('thumbnail',))
+        }
+
+    return {
+        'status': 'success',
+        'results': results
+    }
+
+
+def build_single_pdf(data_list):
+    """Render all declarations into one multi-page PDF; returns (buffer, download name, mimetype)"""
+    memory_governor.wait_for_headroom()
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    # Generate single multi-page PDF straight into the response buffer
+    buffer = spooled_buffer()
+    pdf_filler.fill_single_multipage_pdf(data_list, buffer, workers=RENDER_WORKERS)
+
+    return buffer, f'declarations_{timestamp}.pdf', 'application/pdf'
+
+
+def build_pdf_zip(data_list):
+    """Render one declaration per vehicle into a ZIP; returns (buffer, download name, mimetype)"""
+    memory_governor.wait_for_headroom()
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    # Generate PDFs in memory (each data entry has its own seller_name);
+    # large batches are spread over RENDER_WORKERS processes
+    pdfs = pdf_filler.render_named_pdfs(data_list, workers=RENDER_WORKERS)
+
+    # Create ZIP file straight into the response buffer
+    buffer = spooled_buffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for filename, pdf in pdfs:
+            zipf.writestr(filename, pdf)
+
+    return buffer, f'SN_{timestamp}.zip', 'application/zip'
+
+
+def build_excel(data_list):
+    """Write the inspection spreadsheet; returns (buffer, download name, mimetype)"""
+    memory_governor.wait_for_headroom()
+    workbook = InspectionWorkbook()
+    for data in data_list:
+        workbook.add_row(data)
+
+    # Save workbook straight into the response buffer
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    buffer = spooled_buffer()
+    workbook.save(buffer)
+
+    return (buffer, f'inspection_data_{timestamp}.xlsx',
+            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+
+def build_bundle(data_list):
+    """Render every download into one ZIP, each declaration once; returns (buffer, download name, mimetype)"""
+    memory_governor.wait_for_headroom()
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    combined_pdf, pdfs = pdf_filler.render_bundle(data_list, workers=RENDER_WORKERS)
+
+    workbook = InspectionWorkbook()
+    for data in data_list:
+        workbook.add_row(data)
+
+    # PDFs and .xlsx are already compressed, so entries are stored as-is
+    buffer = spooled_buffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zipf:
+        zipf.writestr(f'declarations_{timestamp}.pdf', combined_pdf)
+        with zipf.open(f'inspection_data_{timestamp}.xlsx', 'w') as xlsx:
+            workbook.save(xlsx)
+        for filename, pdf in pdfs:
+            zipf.writestr(f'SN_{timestamp}/{filename}', pdf)
+
+    return buffer, f'declarations_bundle_{timestamp}.zip', 'application/zip'
+
+
+# Generate endpoints by path, shared with the ASGI front-end (server/asgi.py)
+GENERATORS = {
+    '/api/generate-single-pdf': build_single_pdf,
+    '/api/generate-pdfs': build_pdf_zip,
+    '/api/generate-excel': build_excel,
+    '/api/generate-bundle': build_bundle
+}
+
+
 @app.route('/')
 def index():
     """Serve the main web interface"""
-    return send_from_directory(app.static_folder, 'index.html')
+    return send_from_directory(BASE_DIR, 'index.html')
+
+
+@app.route('/<path:filename>')
+def frontend_file(filename):
+    """Serve the web interface's scripts, styles and icon (nothing else in the project root)"""
+    if filename not in FRONTEND_FILES:
+        return jsonify({'error': 'Not found'}), 404
+    return send_from_directory(BASE_DIR, filename)
 
 
 @app.route('/api/upload', methods=['POST'])
@@ -120,11 +560,11 @@ def upload_files():
     """
     Handle file upload and OCR processing
     Returns extracted data for all uploaded files
+
+    With ?format=columnar the extracted data is returned once as a columnar
+    'batch' and each successful result carries its 'row' in that batch.
     """
     try:
-        # Clean up old files
-        cleanup_old_files()
-
         if 'files' not in request.files:
             return jsonify({'error': 'No files provided'}), 400
 
@@ -133,70 +573,37 @@ def upload_files():
         if not files or files[0].filename == '':
             return jsonify({'error': 'No files selected'}), 400
 
+        try:
+            ticket = admit_upload(files, request.headers, request.remote_addr)
+        except SchedulerFull as e:
+            return jsonify(busy_body(e)), 429, {'Retry-After': str(e.retry_after)}
+
         results = []
 
-        for file in files:
-            if file and allowed_file(file.filename):
-                # Save uploaded file
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                unique_filename = f"{timestamp}_{filename}"
-                file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-                file.save(file_path)
-
-                try:
-                    # Process file with OCR
-                    ocr_text = ocr_processor.process_file(file_path)
-
-                    # DEBUG: Print raw OCR text
-                    import sys
-                    print("=" * 80, flush=True)
-                    print(f"OCR TEXT FOR {filename}:", flush=True)
-                    print("-" * 80, flush=True)
-                    print(ocr_text, flush=True)
-                    print("=" * 80, flush=True)
-
-                    # Parse extracted text
-                    extracted_data = data_parser.parse_text(ocr_text)
-
-                    # DEBUG: Print extracted data
-                    print("EXTRACTED DATA:", flush=True)
-                    print(extracted_data, flush=True)
-                    print("=" * 80, flush=True)
-
-                    # Add source filename
-                    extracted_data['source_filename'] = filename
-                    extracted_data['ocr_text'] = ocr_text[:500]  # Include first 500 chars for debugging
-
-                    # Generate thumbnail for preview
-                    thumbnail = generate_thumbnail(file_path)
+        with ticket:
+            for file in files:
+                if file and allowed_file(file.filename):
+                    # Save uploaded file
+                    filename = secure_filename(file.filename)
+                    file_path = upload_path(filename)
+                    file.save(file_path)
+                    janitor.track(file_path)
 
-                    results.append({
-                        'filename': filename,
-                        'status': 'success',
-                        'data': extracted_data,
-                        'thumbnail': thumbnail
-                    })
+                    # OCR waits for this client's turn; reused results skip the queue
+                    results.append(extract_upload(file_path, filename, ticket.slot()))
 
-                except Exception as e:
+                else:
                     results.append({
-                        'filename': filename,
+                        'filename': file.filename,
                         'status': 'error',
-                        'error': str(e)
+                        'error': 'Invalid file type'
                     })
 
-            else:
-                results.append({
-                    'filename': file.filename,
-                    'status': 'error',
-                    'error': 'Invalid file type'
-                })
-
-        return jsonify({
-            'status': 'success',
-            'results': results
-        })
+        flag_batch_duplicates(results)
+        return jsonify(upload_response(results, request.args.get('format') == 'columnar'))
 
+    except MemoryPressure as e:
+        return jsonify(busy_body(e)), 503, {'Retry-After': str(e.retry_after)}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -208,20 +615,19 @@ def generate_single_pdf():
     Returns a single PDF file
     """
     try:
-        data_list = request.json.get('data', [])
+        data_list = load_data_list()
 
         if not data_list:
             return jsonify({'error': 'No data provided'}), 400
 
-        # Create unique output file
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        pdf_path = os.path.join(OUTPUT_FOLDER, f'declarations_{timestamp}.pdf')
-
-        # Generate single multi-page PDF
-        pdf_filler.fill_single_multipage_pdf(data_list, pdf_path)
-
-        return send_file(pdf_path, as_attachment=True, download_name=f'declarations_{timestamp}.pdf')
+        return send_buffer(*build_single_pdf(data_list))
 
+    except MemoryPressure as e:
+        return jsonify(busy_body(e)), 503, {'Retry-After': str(e.retry_after)}
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -233,125 +639,177 @@ def generate_pdfs():
     Returns a ZIP file containing all PDFs
     """
     try:
-        data_list = request.json.get('data', [])
+        data_list = load_data_list()
 
         if not data_list:
             return jsonify({'error': 'No data provided'}), 400
 
-        # Create unique output folder for this batch
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        batch_folder = os.path.join(TEMP_FOLDER, f'batch_{timestamp}')
-        os.makedirs(batch_folder, exist_ok=True)
+        return send_buffer(*build_pdf_zip(data_list))
 
-        # Generate PDFs (each data entry has its own seller_name)
-        pdf_files = pdf_filler.fill_multiple_forms(data_list, batch_folder)
+    except MemoryPressure as e:
+        return jsonify(busy_body(e)), 503, {'Retry-After': str(e.retry_after)}
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        # Create ZIP file
-        zip_path = os.path.join(OUTPUT_FOLDER, f'SN_{timestamp}.zip')
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for pdf_file in pdf_files:
-                zipf.write(pdf_file, os.path.basename(pdf_file))
 
-        # Clean up individual PDF files
-        shutil.rmtree(batch_folder)
+@app.route('/api/generate-excel', methods=['POST'])
+def generate_excel():
+    """
+    Generate Excel file with all extracted data
+    """
+    try:
+        data_list = load_data_list()
+
+        if not data_list:
+            return jsonify({'error': 'No data provided'}), 400
 
-        return send_file(zip_path, as_attachment=True, download_name=f'SN_{timestamp}.zip')
+        return send_buffer(*build_excel(data_list))
 
+    except MemoryPressure as e:
+        return jsonify(busy_body(e)), 503, {'Retry-After': str(e.retry_after)}
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/generate-excel', methods=['POST'])
-def generate_excel():
+@app.route('/api/generate-bundle', methods=['POST'])
+def generate_bundle():
     """
-    Generate Excel file with all extracted data
+    Generate every download in one request
+    Returns a ZIP with the combined PDF, the Excel sheet and one PDF per vehicle,
+    rendering each declaration once
     """
     try:
-        data_list = request.json.get('data', [])
+        data_list = load_data_list()
 
         if not data_list:
             return jsonify({'error': 'No data provided'}), 400
 
-        # Create workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Inspection Data"
-
-        # Define headers
-        headers = ['Vendor', 'Source File', 'Stock #', 'Year', 'Make', 'Model', 'Body', 'Auto/Man',
-                  'Colour', 'Engine No', 'VIN', 'Registration', 'Registration Expiry', 'Odometer']
-
-        # Write headers
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True, size=11)
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-        # Write data
-        for row_idx, data in enumerate(data_list, 2):
-            ws.cell(row=row_idx, column=1, value=data.get('seller_name', ''))
-            ws.cell(row=row_idx, column=2, value=data.get('source_filename', ''))
-            ws.cell(row=row_idx, column=3, value=data.get('mta', ''))
-            ws.cell(row=row_idx, column=4, value=data.get('year', ''))
-            ws.cell(row=row_idx, column=5, value=data.get('make', ''))
-            ws.cell(row=row_idx, column=6, value=data.get('model', ''))
-            ws.cell(row=row_idx, column=7, value=data.get('type', ''))
-            ws.cell(row=row_idx, column=8, value=data.get('transmission', ''))
-            ws.cell(row=row_idx, column=9, value=data.get('color', ''))
-            ws.cell(row=row_idx, column=10, value=data.get('engine_no', ''))
-            ws.cell(row=row_idx, column=11, value=data.get('vin', ''))
-            ws.cell(row=row_idx, column=12, value=data.get('reg', ''))
-            ws.cell(row=row_idx, column=13, value=data.get('rego_expiry', ''))
-            ws.cell(row=row_idx, column=14, value=data.get('odometer', ''))
-
-        # Adjust column widths
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column].width = adjusted_width
-
-        # Save workbook
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        excel_path = os.path.join(OUTPUT_FOLDER, f'inspection_data_{timestamp}.xlsx')
-        wb.save(excel_path)
-
-        return send_file(excel_path, as_attachment=True, download_name=f'inspection_data_{timestamp}.xlsx')
+        return send_buffer(*build_bundle(data_list))
 
+    except MemoryPressure as e:
+        return jsonify(busy_body(e)), 503, {'Retry-After': str(e.retry_after)}
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    """Health check endpoint"""
-    # Check if Tesseract is available
-    tesseract_available = False
-    tesseract_version = None
+@app.route('/api/reparse', methods=['POST'])
+def reparse_record():
+    """
+    Re-derive the fields affected by a user edit without re-uploading
+    Body: {record_id?, data?: current values, edits: {field: value}}
+    Returns only the fields that changed
+    """
     try:
-        import subprocess
-        result = subprocess.run(['tesseract', '--version'],
-                              capture_output=True, text=True, timeout=5)
-        tesseract_available = result.returncode == 0
-        if tesseract_available:
-            tesseract_version = result.stdout.split('\n')[0]
+        payload = request.get_json(silent=True) or {}
+        edits = payload.get('edits') or {}
+        record_id = payload.get('record_id')
+        current = payload.get('data')
+
+        if not isinstance(edits, dict) or not isinstance(current or {}, dict):
+            return jsonify({'error': "'edits' and 'data' must be objects"}), 400
+
+        stored = None
+        ocr_text = None
+        if record_id is not None:
+            stored = extraction_store.get(record_id)
+            if stored is None:
+                return jsonify({'error': 'Record not found'}), 404
+            current = {**stored, **(current or {})}
+            ocr_text = extraction_store.get_ocr_text(record_id)
+
+        if not edits and not ocr_text:
+            return jsonify({'error': 'No edits provided'}), 400
+
+        changed = data_parser.reparse(edits, current, ocr_text)
+
+        # Keep the stored record in step so regenerating by id uses the edit; only the
+        # edit and what it changed are written, not the rest of the client's row
+        if stored is not None:
+            edited = {field: value for field, value in edits.items() if field not in ('description', 'ocr_text')}
+            merged = {**stored, **edited, **changed}
+            if not merged.get('vin_warning'):
+                merged.pop('vin_warning', None)
+            extraction_store.update(record_id, merged)
+
+        return jsonify({
+            'status': 'success',
+            'changed': changed
+        })
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        tesseract_version = f"Error: {str(e)}"
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/records', methods=['GET'])
+def list_records():
+    """
+    Search stored extractions by VIN, MTA/stock number, registration or upload time
+    Query parameters: vin, mta, reg, since, until (Unix seconds), limit
+    """
+    try:
+        since = request.args.get('since', type=float)
+        until = request.args.get('until', type=float)
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+
+        records = extraction_store.find(
+            vin=request.args.get('vin'),
+            mta=request.args.get('mta'),
+            reg=request.args.get('reg'),
+            since=since,
+            until=until,
+            limit=limit
+        )
+
+        return jsonify({
+            'status': 'success',
+            'records': records
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/records/<int:record_id>', methods=['GET'])
+def get_record(record_id):
+    """Return a single stored extraction"""
+    record = extraction_store.get(record_id)
+    if record is None:
+        return jsonify({'error': 'Record not found'}), 404
+    return jsonify({'status': 'success', 'record': record})
+
+
+@app.route('/api/templates', methods=['GET'])
+def list_templates():
+    """List the declaration templates records can be rendered with"""
+    return jsonify({'status': 'success', 'templates': template_registry.describe()})
+
+
+@app.route('/api/health', methods=['GET'])
+def health_check():
+    """Liveness check - returns capabilities probed at startup"""
+    return jsonify({**health_monitor.liveness(), 'startup': startup_timings, 'ocr_queue': ocr_scheduler.stats(),
+                    'resource_profile': RESOURCE_PROFILE, 'memory': memory_governor.stats()})
+
 
-    return jsonify({
-        'status': 'healthy',
-        'template_exists': os.path.exists(TEMPLATE_PDF),
-        'tesseract_available': tesseract_available,
-        'tesseract_version': tesseract_version
-    })
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Readiness check - runs a rate-limited OCR warm-up"""
+    readiness = health_monitor.readiness()
+    return jsonify(readiness), 200 if readiness.get('ready') else 503
 
 
 if __name__ == '__main__':
@@ -370,4 +828,6 @@ if __name__ == '__main__':
     print("\nPress Ctrl+C to stop the server")
     print("=" * 80)
 
+    warm_up(run_ocr=WARMUP_OCR)
+    janitor.start()
     app.run(debug=False, host='0.0.0.0', port=port)
@@ -0,0 +1,265 @@
+"""
+ASGI Front-end Module
+Async entry point: uploads, downloads and health checks are awaited while OCR and rendering run in executor pools
+
+Usage: uvicorn server.asgi:app --host 0.0.0.0 --port 5001
+Needs the optional packages in requirements-asgi.txt.
+"""
+
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, nullcontext
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from starlette.applications import Starlette
+    from starlette.middleware import Middleware
+    from starlette.middleware.cors import CORSMiddleware
+    from starlette.responses import JSONResponse, Response, StreamingResponse
+    from starlette.routing import Mount, Route
+    from starlette.staticfiles import StaticFiles
+except ImportError as e:
+    raise ImportError("server.asgi needs the optional ASGI packages: pip install -r requirements-asgi.txt") from e
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+from werkzeug.utils import secure_filename
+
+from server.app import (app as flask_app, FRONTEND_FILES, GENERATORS, admit_upload, allowed_file, busy_body, extract_upload,
+                        extraction_pipeline, flag_batch_duplicates, health_monitor, janitor, load_data_list,
+                        memory_governor, ocr_scheduler, startup_timings, upload_path, upload_response, warm_up)
+from server.config import (BASE_DIR, OCR_POOL_SIZE, WARMUP_OCR, REQUEST_BODY_MAX_BYTES, GZIP_MIN_BYTES,
+                           LOW_RESOURCE, RESOURCE_PROFILE, env_int)
+from server.records import compress_json, decode_body
+from server.governor import MemoryPressure
+from server.scheduler import SchedulerFull
+
+# Requests rendering PDFs/Excel at once; large batches also fan out to the RENDER_WORKERS process pool
+ASGI_RENDER_THREADS = max(1, env_int('ASGI_RENDER_THREADS', 1 if LOW_RESOURCE else 2))
+
+# OCR gets its own pool so long uploads never occupy the threads that render downloads
+ocr_executor = ThreadPoolExecutor(max_workers=OCR_POOL_SIZE, thread_name_prefix='asgi-ocr')
+render_executor = ThreadPoolExecutor(max_workers=ASGI_RENDER_THREADS, thread_name_prefix='asgi-render')
+# Readiness probes run their warm-up OCR here, so a busy OCR pool never delays them
+probe_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='asgi-probe')
+
+# Bytes read per chunk when saving uploads and streaming downloads
+CHUNK_SIZE = 1024 * 1024
+
+
+async def run_in(executor, func, *args):
+    """Await a blocking call on one of the executor pools"""
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+async def json_response(request, content, status_code=200):
+    """
+    JSON response, gzipped like the Flask app does for large bodies
+
+    Args:
+        request: Starlette request (for Accept-Encoding)
+        content: JSON-serializable body
+        status_code: HTTP status
+
+    Returns:
+        Starlette Response
+    """
+    body = json.dumps(content).encode()
+    headers = {}
+    if len(body) >= GZIP_MIN_BYTES and 'gzip' in request.headers.get('accept-encoding', '').lower():
+        body = await run_in(render_executor, compress_json, body)
+        headers = {'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'}
+    return Response(body, status_code, headers=headers, media_type='application/json')
+
+
+async def busy_response(request, error, status_code):
+    """429/503 response with a Retry-After header for a refused request"""
+    response = await json_response(request, busy_body(error), status_code)
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def iter_buffer(buffer):
+    """Yield a spooled response buffer in chunks, closing it at the end"""
+    try:
+        buffer.seek(0)
+        while True:
+            chunk = buffer.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        buffer.close()
+
+
+async def save_upload(upload, file_path):
+    """Copy an uploaded file to disk without holding the event loop for the whole file"""
+    with open(file_path, 'wb') as f:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            f.write(chunk)
+
+
+async def scheduled_extract(ticket, file_path, filename):
+    """
+    Reuse the result of a byte-identical earlier upload at once; otherwise wait for memory
+    and the client's turn on the event loop, then OCR on the pool (which never queues)
+    """
+    found = await run_in(None, extraction_pipeline.lookup, file_path)
+    if found[1] is not None:
+        return await run_in(None, extract_upload, file_path, filename, nullcontext(), found)
+
+    await memory_governor.wait_for_headroom_async()
+    await ticket.acquire_async()
+    try:
+        return await run_in(ocr_executor, extract_upload, file_path, filename, nullcontext(), found)
+    finally:
+        ticket.release()
+
+
+async def upload_files(request):
+    """
+    Handle file upload and OCR processing
+    Files are saved as they stream in; OCR for each file runs concurrently on the OCR pool
+    """
+    try:
+        form = await request.form()
+        files = [item for item in form.getlist('files') if hasattr(item, 'filename')]
+
+        if not files:
+            return await json_response(request, {'error': 'No files provided'}, 400)
+        if files[0].filename == '':
+            return await json_response(request, {'error': 'No files selected'}, 400)
+
+        try:
+            ticket = admit_upload(files, request.headers, request.client.host if request.client else None)
+        except SchedulerFull as e:
+            await form.close()
+            return await busy_response(request, e, 429)
+
+        with ticket:
+            jobs = []
+            for file in files:
+                if allowed_file(file.filename):
+                    filename = secure_filename(file.filename)
+                    file_path = upload_path(filename)
+                    await save_upload(file, file_path)
+                    janitor.track(file_path)
+                    jobs.append(scheduled_extract(ticket, file_path, filename))
+                else:
+                    jobs.append(asyncio.sleep(0, {
+                        'filename': file.filename,
+                        'status': 'error',
+                        'error': 'Invalid file type'
+                    }))
+
+            # Results keep upload order however the OCR jobs finish
+            results = list(await asyncio.gather(*jobs))
+        await form.close()
+
+        flag_batch_duplicates(results)
+        return await json_response(request, upload_response(results, request.query_params.get('format') == 'columnar'))
+
+    except MemoryPressure as e:
+        return await busy_response(request, e, 503)
+    except Exception as e:
+        return await json_response(request, {'error': str(e)}, 500)
+
+
+def make_generate_endpoint(builder):
+    """Wrap one of server.app's download builders in an async endpoint"""
+
+    def build(raw, content_encoding):
+        payload = decode_body(raw, content_encoding, REQUEST_BODY_MAX_BYTES)
+        data_list = load_data_list(payload if isinstance(payload, dict) else {})
+        if not data_list:
+            raise ValueError('No data provided')
+        return builder(data_list)
+
+    async def endpoint(request):
+        try:
+            raw = await request.body()
+            buffer, download_name, mimetype = await run_in(
+                render_executor, build, raw, request.headers.get('content-encoding'))
+        except MemoryPressure as e:
+            return await busy_response(request, e, 503)
+        except LookupError as e:
+            return await json_response(request, {'error': str(e)}, 404)
+        except ValueError as e:
+            return await json_response(request, {'error': str(e)}, 400)
+        except Exception as e:
+            return await json_response(request, {'error': str(e)}, 500)
+
+        return StreamingResponse(iter_buffer(buffer), media_type=mimetype,
+                                 headers={'Content-Disposition': f'attachment; filename={download_name}'})
+
+    return endpoint
+
+
+async def health_check(request):
+    """Liveness check - answered on the event loop from cached capabilities"""
+    return await json_response(request, {**health_monitor.liveness(), 'startup': startup_timings,
+                                         'ocr_queue': ocr_scheduler.stats(), 'resource_profile': RESOURCE_PROFILE,
+                                         'memory': memory_governor.stats()})
+
+
+async def readiness_check(request):
+    """Readiness check - the rate-limited OCR warm-up runs on its own thread, never behind uploads"""
+    readiness = await run_in(probe_executor, health_monitor.readiness)
+    return await json_response(request, readiness, 200 if readiness.get('ready') else 503)
+
+
+# Remaining API routes (records, reparse, templates) are served by the Flask app on
+# Starlette's thread pool; otherwise only the frontend files in the project root are served
+flask_fallback = WSGIMiddleware(flask_app)
+static_files = StaticFiles(directory=BASE_DIR, html=True)
+
+
+async def fallback(scope, receive, send):
+    """Send other /api/ paths to Flask, frontend files to the static file server and the rest a 404"""
+    if scope['type'] == 'http' and scope['path'].startswith('/api/'):
+        await flask_fallback(scope, receive, send)
+    elif scope['type'] == 'http' and (scope['path'].lstrip('/') or 'index.html') in FRONTEND_FILES:
+        await static_files(scope, receive, send)
+    else:
+        await JSONResponse({'error': 'Not found'}, 404)(scope, receive, send)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Warm up and start the janitor in each server process"""
+    await run_in(render_executor, warm_up, WARMUP_OCR)
+    janitor.start()
+    yield
+    janitor.stop()
+
+
+routes = [
+    Route('/api/upload', upload_files, methods=['POST']),
+    Route('/api/health', health_check, methods=['GET']),
+    Route('/api/ready', readiness_check, methods=['GET'])
+]
+routes.extend(Route(path, make_generate_endpoint(builder), methods=['POST']) for path, builder in GENERATORS.items())
+routes.append(Mount('/', app=fallback))
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5001)))
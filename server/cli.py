@@ -0,0 +1,347 @@
+"""
+Batch CLI Module
+Runs a folder of inspection reports through OCR, parsing and PDF filling without the web server
+
+Usage: python -m server.cli INPUT_DIR OUTPUT_DIR [--seller NAME] [--workers N] [--template NAME]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from server.config import (TEMPLATE_PDF, TEMPLATES_FOLDER, DEFAULT_TEMPLATE_NAME, EXTRACTION_DB_PATH,
+                           RENDER_WORKERS, OCR_MAX_PAGES,
+                           OCR_STOP_AT_VEHICLE_BLOCK, OCR_DPI, OCR_MAX_IMAGE_PIXELS)
+from server.dedup import dedupe_records
+from server.ocr_processor import IMAGE_EXTENSIONS
+
+REPORT_EXTENSIONS = tuple(IMAGE_EXTENSIONS) + ('.pdf',)
+
+
+def find_reports(input_dir):
+    """
+    List report files under a folder, recursively, in a stable order
+
+    Args:
+        input_dir: Folder to scan
+
+    Returns:
+        Sorted list of paths
+    """
+    found = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(REPORT_EXTENSIONS) and not name.startswith('.'):
+                found.append(os.path.join(root, name))
+    return found
+
+
+class Checkpoint:
+    """Append-only JSON Lines log of finished files, so an interrupted run can resume"""
+
+    def __init__(self, path):
+        """
+        Open a checkpoint, loading entries from an earlier run
+
+        Args:
+            path: Checkpoint file path (created if missing)
+        """
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A run killed mid-write leaves a partial last line
+                        continue
+                    self.entries[entry['key']] = entry
+        self._file = open(path, 'a')
+
+    @staticmethod
+    def key(file_path, input_dir):
+        """Identify a file by relative path, size and modification time"""
+        stat = os.stat(file_path)
+        return f"{os.path.relpath(file_path, input_dir)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    def done(self, key):
+        """True if the file finished successfully in this or an earlier run (failures are retried)"""
+        entry = self.entries.get(key)
+        return entry is not None and entry['status'] == 'success'
+
+    def add(self, entry):
+        """Record a finished file and flush it to disk immediately"""
+        self.entries[entry['key']] = entry
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# Set in each OCR process by _init_ocr_worker()
+_worker_pipeline = None
+
+
+def _init_ocr_worker():
+    """Build an OCR + parse pipeline once per worker process (storage stays in the parent)"""
+    global _worker_pipeline
+    from server.data_parser import DataParser
+    from server.ocr_processor import OCRProcessor
+    from server.pipeline import ExtractionPipeline
+
+    ocr_processor = OCRProcessor(max_pages=OCR_MAX_PAGES, stop_at_vehicle_block=OCR_STOP_AT_VEHICLE_BLOCK,
+                                 dpi=OCR_DPI, max_image_pixels=OCR_MAX_IMAGE_PIXELS)
+    _worker_pipeline = ExtractionPipeline(ocr_processor, DataParser())
+
+
+def _recognize_file(file_path):
+    """OCR and parse one file in a worker process"""
+    started = time.perf_counter()
+    filename = os.path.basename(file_path)
+    try:
+        ocr_text = _worker_pipeline.recognize(file_path, filename)
+        ocr_ms = (time.perf_counter() - started) * 1000
+        data = _worker_pipeline.parse(ocr_text, filename)
+        return {'status': 'success', 'data': data, 'ocr_text': ocr_text, 'ocr_ms': ocr_ms}
+    except Exception as e:
+        return {'status': 'error', 'error': str(e), 'ocr_ms': (time.perf_counter() - started) * 1000}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (0 if empty)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def extract_all(files, input_dir, checkpoint, pipeline, workers, stats):
+    """
+    Stream files through a pool of OCR processes, checkpointing each result as it finishes
+
+    At most two files per worker are in flight, so memory stays flat however
+    large the folder is.
+
+    Args:
+        files: Report paths, in input order
+        input_dir: Folder the paths are relative to (for checkpoint keys)
+        checkpoint: Checkpoint to skip finished files and record new ones
+        pipeline: Parent-side ExtractionPipeline used for hashing and storage
+        workers: Number of OCR processes
+        stats: Dictionary of counters updated in place
+    """
+    def finish(key, file_path, file_hash, result):
+        filename = os.path.basename(file_path)
+        entry = {'key': key, 'path': file_path, 'status': result['status']}
+        if result['status'] == 'success':
+            data = result['data']
+            if 'ocr_text' in result:
+                pipeline.record(data, result['ocr_text'], filename, file_hash)
+            entry['data'] = data
+            stats['succeeded'] += 1
+            if 'ocr_ms' in result:
+                stats['ocr_ms'].append(result['ocr_ms'])
+        else:
+            entry['error'] = result['error']
+            stats['failed'] += 1
+            print(f"  FAILED {filename}: {result['error']}", flush=True)
+        checkpoint.add(entry)
+
+        done = stats['succeeded'] + stats['failed']
+        if done % 25 == 0:
+            elapsed = time.perf_counter() - stats['extract_started']
+            print(f"  {done} files done, {done / elapsed:.2f} files/s", flush=True)
+
+    def collect(block_until):
+        # Record finished futures until no more than block_until are still running
+        while len(in_flight) > block_until:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                finish(*in_flight.pop(future), future.result())
+
+    in_flight = {}
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker)
+    try:
+        for file_path in files:
+            key = Checkpoint.key(file_path, input_dir)
+            if checkpoint.done(key):
+                stats['skipped'] += 1
+                continue
+
+            # Byte-identical report already in the store: reuse it without OCR
+            file_hash, previous = pipeline.lookup(file_path)
+            if previous is not None:
+                previous['source_filename'] = os.path.basename(file_path)
+                stats['reused'] += 1
+                finish(key, file_path, file_hash, {'status': 'success', 'data': previous})
+                continue
+
+            # Backpressure: wait for a free slot before reading further ahead
+            collect(workers * 2 - 1)
+            in_flight[pool.submit(_recognize_file, file_path)] = (key, file_path, file_hash)
+
+        collect(0)
+    finally:
+        # On interrupt, finished files are already checkpointed; drop the rest
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def write_outputs(data_list, output_dir, render_workers, stats):
+    """
+    Render the declarations, a ZIP of them and the Excel summary
+
+    Args:
+        data_list: Data dictionaries in input order (each with seller_name)
+        output_dir: Folder to write into
+        render_workers: Number of PDF rendering processes
+        stats: Dictionary of counters updated in place
+
+    Returns:
+        List of paths written
+    """
+    from server.excel_writer import InspectionWorkbook
+    from server.pdf_filler import PDFFiller
+    from server.templates import DEFAULT_TEMPLATE, TemplateRegistry
+
+    registry = TemplateRegistry(DEFAULT_TEMPLATE_NAME)
+    registry.register(DEFAULT_TEMPLATE, TEMPLATE_PDF, label='Declaration and Contract of Sale')
+    registry.load_folder(TEMPLATES_FOLDER)
+    pdf_filler = PDFFiller(registry=registry)
+
+    # One declaration per vehicle in every output
+    data_list = dedupe_records(data_list)
+
+    started = time.perf_counter()
+    combined_pdf, pdfs = pdf_filler.render_bundle(data_list, workers=render_workers)
+    stats['render_s'] = time.perf_counter() - started
+
+    declarations_dir = os.path.join(output_dir, 'declarations')
+    os.makedirs(declarations_dir, exist_ok=True)
+
+    combined_path = os.path.join(output_dir, 'declarations.pdf')
+    with open(combined_path, 'wb') as f:
+        f.write(combined_pdf)
+
+    zip_path = os.path.join(output_dir, 'declarations.zip')
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zipf:
+        for filename, pdf in pdfs:
+            with open(os.path.join(declarations_dir, filename), 'wb') as f:
+                f.write(pdf)
+            zipf.writestr(filename, pdf)
+
+    workbook = InspectionWorkbook()
+    for data in data_list:
+        workbook.add_row(data)
+    excel_path = os.path.join(output_dir, 'inspection_data.xlsx')
+    workbook.save(excel_path)
+
+    stats['declarations'] = len(pdfs)
+    return [combined_path, zip_path, declarations_dir, excel_path]
+
+
+def print_stats(stats):
+    """Print throughput figures for the run"""
+    extract_s = stats['extract_s']
+    processed = stats['succeeded'] + stats['failed']
+    ocr_ms = stats['ocr_ms']
+
+    print("=" * 80)
+    print(f"Files found:        {stats['found']}")
+    print(f"Already done:       {stats['skipped']} (from checkpoint)")
+    print(f"Processed:          {processed} ({stats['succeeded']} ok, {stats['failed']} failed, "
+          f"{stats['reused']} reused without OCR)")
+    if processed:
+        print(f"Extraction:         {extract_s:.1f}s, {processed / extract_s:.2f} files/s "
+              f"with {stats['workers']} OCR worker(s)")
+    if ocr_ms:
+        print(f"OCR per file:       mean {sum(ocr_ms) / len(ocr_ms):.0f}ms, "
+              f"p50 {percentile(ocr_ms, 0.5):.0f}ms, p95 {percentile(ocr_ms, 0.95):.0f}ms")
+    if 'render_s' in stats:
+        print(f"Rendering:          {stats['declarations']} declarations from {stats['records']} records "
+              f"in {stats['render_s']:.1f}s")
+    print(f"Total:              {time.perf_counter() - stats['started']:.1f}s")
+    print("=" * 80)
+
+
+def main(argv=None):
+    """Run the batch; returns the process exit code (1 if any file failed)"""
+    parser = argparse.ArgumentParser(
+        prog='python -m server.cli',
+        description='Fill declarations for every inspection report in a folder.')
+    parser.add_argument('input_dir', help='Folder of PDF/image reports (searched recursively)')
+    parser.add_argument('output_dir', help='Folder for declarations, ZIP, Excel summary and checkpoint')
+    parser.add_argument('--seller', default='', help='Seller name for records that have none')
+    parser.add_argument('--template', default=None, help='Declaration template for every record')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='OCR processes')
+    parser.add_argument('--render-workers', type=int, default=RENDER_WORKERS, help='PDF rendering processes')
+    parser.add_argument('--checkpoint', default=None,
+                        help='Checkpoint file (default OUTPUT_DIR/checkpoint.jsonl)')
+    parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+    parser.add_argument('--no-store', action='store_true',
+                        help="Don't look up or save results in the extraction database")
+    args = parser.parse_args(argv)
+
+    from server.pipeline import ExtractionPipeline
+    from server.store import ExtractionStore
+
+    if not os.path.isdir(args.input_dir):
+        parser.error(f"Input folder not found: {args.input_dir}")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    checkpoint_path = args.checkpoint or os.path.join(args.output_dir, 'checkpoint.jsonl')
+    if args.restart and os.path.exists(checkpoint_path):
+        os.unlink(checkpoint_path)
+
+    stats = {'started': time.perf_counter(), 'found': 0, 'skipped': 0, 'succeeded': 0, 'failed': 0,
+             'reused': 0, 'ocr_ms': [], 'workers': max(1, args.workers)}
+
+    files = find_reports(args.input_dir)
+    stats['found'] = len(files)
+    print(f"Found {len(files)} report(s) in {args.input_dir}", flush=True)
+
+    checkpoint = Checkpoint(checkpoint_path)
+    store = None if args.no_store else ExtractionStore(EXTRACTION_DB_PATH)
+    pipeline = ExtractionPipeline(None, None, store)
+
+    stats['extract_started'] = time.perf_counter()
+    try:
+        extract_all(files, args.input_dir, checkpoint, pipeline, stats['workers'], stats)
+    except KeyboardInterrupt:
+        print("\nInterrupted - finished files are checkpointed; run again to resume", flush=True)
+        return 130
+    finally:
+        stats['extract_s'] = max(time.perf_counter() - stats['extract_started'], 1e-9)
+        checkpoint.close()
+
+    # Everything finished in this run or an earlier one, in input order
+    data_list = []
+    for file_path in files:
+        entry = checkpoint.entries.get(Checkpoint.key(file_path, args.input_dir))
+        if entry is not None and entry['status'] == 'success':
+            data = dict(entry['data'])
+            data['seller_name'] = data.get('seller_name') or args.seller
+            if args.template:
+                data['template'] = args.template
+            data_list.append(data)
+    stats['records'] = len(data_list)
+
+    if data_list:
+        for path in write_outputs(data_list, args.output_dir, args.render_workers, stats):
+            print(f"Wrote {path}", flush=True)
+    else:
+        print("No records extracted; nothing to render", flush=True)
+
+    print_stats(stats)
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.exit(main())
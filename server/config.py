@@ -0,0 +1,107 @@
+"""
+Configuration Module
+Paths and tunables shared by the server, overridable through environment variables
+"""
+
+import os
+
+
+def env_int(name, default):
+    """Read an integer setting from the environment, falling back to default"""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# Resource profile: 'standard', or 'small' for ~512 MB containers. 'small' lowers the
+# defaults marked below; a setting given explicitly in the environment still wins
+RESOURCE_PROFILE = os.environ.get('RESOURCE_PROFILE', 'standard')
+LOW_RESOURCE = RESOURCE_PROFILE == 'small'
+
+# Paths
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
+OUTPUT_FOLDER = os.path.join(BASE_DIR, 'output')
+TEMP_FOLDER = os.path.join(BASE_DIR, 'temp')
+TEMPLATE_PDF = os.path.join(BASE_DIR, 'Target.pdf')
+
+# Extra declaration templates: one JSON manifest per template (see server/templates.py)
+TEMPLATES_FOLDER = os.environ.get('TEMPLATES_FOLDER', os.path.join(BASE_DIR, 'templates'))
+
+# Template used for records and requests that don't name one ('default' is Target.pdf)
+DEFAULT_TEMPLATE_NAME = os.environ.get('DEFAULT_TEMPLATE', 'default')
+
+# Maximum number of Tesseract jobs running at once in each worker process
+OCR_POOL_SIZE = max(1, env_int('OCR_POOL_SIZE', 1))
+
+# Run one OCR during warm-up so the first upload skips Tesseract start-up cost
+WARMUP_OCR = os.environ.get('WARMUP_OCR', '0') == '1'
+
+# Background cleanup: how long artifacts live in each folder, and a combined size ceiling
+UPLOAD_TTL_SECONDS = env_int('UPLOAD_TTL_SECONDS', 3600)
+TEMP_TTL_SECONDS = env_int('TEMP_TTL_SECONDS', 3600)
+OUTPUT_TTL_SECONDS = env_int('OUTPUT_TTL_SECONDS', 3600)
+DISK_CEILING_MB = env_int('DISK_CEILING_MB', 500)
+JANITOR_INTERVAL_SECONDS = env_int('JANITOR_INTERVAL_SECONDS', 60)
+
+# Generated downloads are built in memory and only spill to a temp file above this size (small: 4)
+RESPONSE_SPOOL_MAX_BYTES = env_int('RESPONSE_SPOOL_MAX_MB', 4 if LOW_RESOURCE else 32) * 1024 * 1024
+
+# SQLite database holding every parsed upload
+DATA_FOLDER = os.path.join(BASE_DIR, 'data')
+EXTRACTION_DB_PATH = os.environ.get('EXTRACTION_DB_PATH', os.path.join(DATA_FOLDER, 'extractions.db'))
+
+# Page policy for PDFs and multi-page TIFFs: OCR at most OCR_MAX_PAGES pages (0 = all),
+# and with OCR_STOP_AT_VEHICLE_BLOCK=1 stop once the vehicle description and VIN are found
+# (small: 2 pages, stop at the vehicle block)
+OCR_MAX_PAGES = max(0, env_int('OCR_MAX_PAGES', 2 if LOW_RESOURCE else 0))
+OCR_STOP_AT_VEHICLE_BLOCK = os.environ.get('OCR_STOP_AT_VEHICLE_BLOCK', '1' if LOW_RESOURCE else '0') == '1'
+
+# Resolution PDF pages are rasterized at for OCR (small: 200; an A4 page is 2.2x smaller than at 300)
+OCR_DPI = env_int('OCR_DPI', 200 if LOW_RESOURCE else 300)
+
+# Photos and scans over this many megapixels are downscaled before OCR (0 = never;
+# small: 4, about an A4 page at 200 DPI)
+OCR_MAX_IMAGE_PIXELS = int(env_int('OCR_MAX_IMAGE_MP', 4 if LOW_RESOURCE else 0) * 1_000_000)
+
+# Longest side of upload preview thumbnails, in pixels (small: 240)
+THUMBNAIL_MAX_PX = env_int('THUMBNAIL_MAX_PX', 240 if LOW_RESOURCE else 400)
+
+# Processes each server process uses to render large declaration batches (0 = share the CPU
+# cores between the WEB_CONCURRENCY gunicorn workers; small: 1)
+RENDER_WORKERS = env_int('RENDER_WORKERS', 1 if LOW_RESOURCE else 0) or \
+    max(1, (os.cpu_count() or 1) // max(1, env_int('WEB_CONCURRENCY', 1)))
+
+# Largest JSON request body accepted after decompression (gzip/deflate/br; small: 16)
+REQUEST_BODY_MAX_BYTES = env_int('REQUEST_BODY_MAX_MB', 16 if LOW_RESOURCE else 64) * 1024 * 1024
+
+# Most records one generate request may name, across data, batch and record_ids (small: 250)
+MAX_REQUEST_RECORDS = env_int('MAX_REQUEST_RECORDS', 250 if LOW_RESOURCE else 1000)
+
+# JSON responses at least this large are gzipped for clients that accept it
+GZIP_MIN_BYTES = env_int('GZIP_MIN_BYTES', 1024)
+
+# OCR admission control (per worker process): outstanding OCR jobs one client, and all
+# clients together, may have before new uploads get 429; uploads of at most
+# SMALL_JOB_FILES files are served ahead of bulk uploads (small: 10 and 30)
+MAX_CLIENT_OCR_JOBS = env_int('MAX_CLIENT_OCR_JOBS', 10 if LOW_RESOURCE else 20)
+MAX_TOTAL_OCR_JOBS = env_int('MAX_TOTAL_OCR_JOBS', 30 if LOW_RESOURCE else 100)
+SMALL_JOB_FILES = env_int('SMALL_JOB_FILES', 3)
+
+# Reverse proxies in front of the server that append to X-Forwarded-For (Render: 1). Clients
+# are queued by the address the outermost of them saw; 0 uses the peer address
+TRUSTED_PROXY_HOPS = max(0, env_int('TRUSTED_PROXY_HOPS', 1))
+
+# Folder for the memory-mapped page rasters handed between preprocessing and Tesseract.
+# The janitor expires anything left in it, so use a dedicated folder (e.g. /dev/shm/ddd-pages
+# keeps pages off disk if /dev/shm is large enough)
+PAGE_BUFFER_FOLDER = os.environ.get('PAGE_BUFFER_FOLDER') or os.path.join(TEMP_FOLDER, 'pages')
+
+# Memory governor: new OCR and rendering work waits while memory in use is above
+# MEMORY_SOFT_LIMIT_MB (0 = off; small: 384), and gets 503 after MEMORY_WAIT_SECONDS. Memory in
+# use is the container's cgroup usage (all workers, Tesseract and Poppler), or outside a
+# cgroup this worker and its child processes. Python keeps most memory it has grown to, so
+# pair the limit with worker recycling (GUNICORN_MAX_REQUESTS, see gunicorn.conf.py)
+MEMORY_SOFT_LIMIT_BYTES = env_int('MEMORY_SOFT_LIMIT_MB', 384 if LOW_RESOURCE else 0) * 1024 * 1024
+MEMORY_WAIT_SECONDS = env_int('MEMORY_WAIT_SECONDS', 30)
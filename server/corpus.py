@@ -0,0 +1,359 @@
+"""
+Corpus Module
+Golden-corpus accuracy and throughput regression checks for DataParser
+
+Usage: python -m server.corpus [--workers N] [--repeat N] [--update-baseline] [--seed-from-store N]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from server.config import BASE_DIR, EXTRACTION_DB_PATH
+
+CORPUS_FOLDER = os.path.join(BASE_DIR, 'corpus')
+CASES_PATH = os.path.join(CORPUS_FOLDER, 'parser_cases.jsonl')
+BASELINE_PATH = os.path.join(CORPUS_FOLDER, 'parser_baseline.json')
+
+# Fields DataParser.parse_text() fills; a case scores only the fields it lists
+PARSER_FIELDS = ('mta', 'year', 'make', 'model', 'type', 'transmission', 'color',
+                 'engine_no', 'vin', 'reg', 'rego_expiry', 'odometer')
+
+# Fewest cases a baseline may be saved from: with fewer, one flipped field moves a
+# precision or recall by 0.1 or more, too coarse to gate on
+MIN_BASELINE_CASES = 50
+
+# Fixed regex/string workload timed next to the parser. Throughput is saved and compared as
+# parser records per 1000 reference iterations, so a slower or busier machine moves both
+REFERENCE_TEXT = ('MTA 220902 Make MAZDA Model MAZDA3 Colour WHITE Engine No PE20318474\n'
+                  'VIN JM0BN10F200405930 Registration 279VKU Expiry 14/02/2025 Odometer 45,210 km\n') * 10
+REFERENCE_PATTERN = re.compile(r'\b[A-HJ-NPR-Z0-9]{17}\b|\b\d{2}/\d{2}/\d{4}\b|\b[\d,]+\s*km\b', re.IGNORECASE)
+REFERENCE_SECONDS = 0.25
+
+
+def load_cases(path=CASES_PATH):
+    """
+    Read golden cases, one JSON object per line: {"name", "ocr_text", "expected"}
+
+    Args:
+        path: JSONL file
+
+    Returns:
+        List of case dictionaries
+
+    Raises:
+        ValueError: If a line is not a valid case
+    """
+    cases = []
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            case = json.loads(line)
+            if not isinstance(case.get('ocr_text'), str) or not isinstance(case.get('expected'), dict):
+                raise ValueError(f"{path}:{number}: case needs 'ocr_text' and an 'expected' object")
+            unknown = set(case['expected']) - set(PARSER_FIELDS)
+            if unknown:
+                raise ValueError(f"{path}:{number}: unknown fields {sorted(unknown)}")
+            case.setdefault('name', f'line-{number}')
+            cases.append(case)
+    return cases
+
+
+def normalize(value):
+    """Compare values case-insensitively with whitespace collapsed"""
+    return ' '.join(str(value or '').split()).upper()
+
+
+def score(expected, parsed):
+    """
+    Count hits and misses for one case
+
+    A wrong value is both a false positive (something was filled in) and a
+    false negative (the right value was not); an expected '' means the field
+    should stay empty.
+
+    Args:
+        expected: Golden field values
+        parsed: DataParser output
+
+    Returns:
+        Dictionary of field -> [true positives, false positives, false negatives]
+    """
+    counts = {}
+    for field, value in expected.items():
+        want, got = normalize(value), normalize(parsed.get(field))
+        counts[field] = [
+            int(bool(got) and got == want),
+            int(bool(got) and got != want),
+            int(bool(want) and got != want)
+        ]
+    return counts
+
+
+def reference_rate(seconds=REFERENCE_SECONDS):
+    """Iterations per second of the reference workload on this machine, right now"""
+    iterations = 0
+    started = time.perf_counter()
+    while True:
+        for _ in range(20):
+            for line in REFERENCE_TEXT.upper().splitlines():
+                REFERENCE_PATTERN.findall(line.strip())
+        iterations += 20
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            return iterations / elapsed
+
+
+def _evaluate_chunk(cases, repeat):
+    """Parse a share of the corpus in a worker process; scores come from the first pass"""
+    from server.data_parser import DataParser
+
+    parser = DataParser()
+    counts = {}
+    misses = []
+
+    for case in cases:
+        parsed = parser.parse_text(case['ocr_text'])
+        for field, (tp, fp, fn) in score(case['expected'], parsed).items():
+            total = counts.setdefault(field, [0, 0, 0])
+            total[0] += tp
+            total[1] += fp
+            total[2] += fn
+            if fp or fn:
+                misses.append((case['name'], field, case['expected'][field], parsed.get(field) or ''))
+
+    # Throughput: parse only, repeated so short corpora still give a stable time, with the
+    # reference workload timed either side in the same process
+    reference_before = reference_rate()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for case in cases:
+            parser.parse_text(case['ocr_text'])
+    seconds = time.perf_counter() - started
+    reference = (reference_before + reference_rate()) / 2
+    return counts, misses, seconds, len(cases) * repeat, reference
+
+
+def evaluate(cases, workers=1, repeat=20):
+    """
+    Score the parser against the corpus and time it, in parallel
+
+    Args:
+        cases: Cases from load_cases()
+        workers: Processes to spread the cases over (at most one per CPU)
+        repeat: Times each case is parsed for the throughput measurement
+
+    Returns:
+        Report dictionary with per-field precision/recall, misses, records per second and
+        the machine-relative speed
+    """
+    workers = max(1, min(workers, len(cases), os.cpu_count() or 1))
+    chunks = [cases[i::workers] for i in range(workers)]
+
+    started = time.perf_counter()
+    if workers == 1:
+        results = [_evaluate_chunk(chunks[0], repeat)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_evaluate_chunk, chunks, [repeat] * workers))
+    wall_seconds = time.perf_counter() - started
+
+    counts = {}
+    misses = []
+    parse_seconds = 0.0
+    parses = 0
+    references = []
+    for chunk_counts, chunk_misses, seconds, parsed, reference in results:
+        for field, values in chunk_counts.items():
+            total = counts.setdefault(field, [0, 0, 0])
+            for i, value in enumerate(values):
+                total[i] += value
+        misses.extend(chunk_misses)
+        parse_seconds += seconds
+        parses += parsed
+        references.append(reference)
+
+    fields = {}
+    for field in PARSER_FIELDS:
+        if field not in counts:
+            continue
+        tp, fp, fn = counts[field]
+        fields[field] = {
+            'precision': round(tp / (tp + fp), 4) if tp + fp else 1.0,
+            'recall': round(tp / (tp + fn), 4) if tp + fn else 1.0,
+            'tp': tp, 'fp': fp, 'fn': fn
+        }
+
+    records_per_second = parses / parse_seconds if parse_seconds else 0.0
+    reference = sum(references) / len(references)
+    return {
+        'cases': len(cases),
+        'workers': workers,
+        'fields': fields,
+        'misses': sorted(misses),
+        # Average rate of one process; depends on the machine and how busy it is
+        'records_per_second': round(records_per_second, 1),
+        'wall_records_per_second': round(parses / wall_seconds, 1) if wall_seconds else 0.0,
+        # Records per 1000 reference iterations, timed in the same processes: the figure the
+        # baseline keeps, since it carries over between machines and worker counts
+        'relative_speed': round(records_per_second / reference * 1000, 1) if reference else 0.0
+    }
+
+
+def compare(report, baseline, accuracy_tolerance=0.0, speed_tolerance=0.3):
+    """
+    List regressions against a saved baseline
+
+    Args:
+        report: Report from evaluate()
+        baseline: Earlier report (parser_baseline.json)
+        accuracy_tolerance: Allowed drop in any field's precision or recall
+        speed_tolerance: Allowed fractional drop in relative speed (None skips the check)
+
+    Returns:
+        List of regression messages (empty if none)
+    """
+    regressions = []
+    for field, before in baseline.get('fields', {}).items():
+        after = report['fields'].get(field)
+        if after is None:
+            regressions.append(f"{field}: no longer covered by the corpus")
+            continue
+        for metric in ('precision', 'recall'):
+            if after[metric] < before[metric] - accuracy_tolerance:
+                regressions.append(f"{field} {metric}: {before[metric]:.3f} -> {after[metric]:.3f}")
+
+    floor = baseline.get('relative_speed')
+    if speed_tolerance is not None and floor:
+        if report['relative_speed'] < floor * (1 - speed_tolerance):
+            regressions.append(f"throughput: {floor:.0f} -> {report['relative_speed']:.0f} "
+                               f"records per 1000 reference iterations")
+    return regressions
+
+
+def print_report(report):
+    """Print per-field accuracy, misses and throughput"""
+    print(f"{'field':14s} {'precision':>9s} {'recall':>7s} {'tp':>5s} {'fp':>4s} {'fn':>4s}", flush=True)
+    for field, values in report['fields'].items():
+        print(f"{field:14s} {values['precision']:9.3f} {values['recall']:7.3f} "
+              f"{values['tp']:5d} {values['fp']:4d} {values['fn']:4d}", flush=True)
+
+    if report['misses']:
+        print(f"\n{len(report['misses'])} field(s) wrong:", flush=True)
+        for name, field, expected, got in report['misses']:
+            print(f"  {name}: {field} expected {expected!r}, got {got!r}", flush=True)
+
+    print(f"\n{report['cases']} cases on {report['workers']} worker(s): "
+          f"{report['records_per_second']:.0f} records/s per process, "
+          f"{report['wall_records_per_second']:.0f} records/s overall, "
+          f"{report['relative_speed']:.0f} records per 1000 reference iterations", flush=True)
+
+
+def seed_from_store(db_path, path=CASES_PATH, limit=100):
+    """
+    Append recent stored records to the corpus as new cases
+
+    Stored values include users' corrections, so they make good expectations;
+    review the appended lines before committing them.
+
+    Args:
+        db_path: ExtractionStore database
+        path: Corpus file to append to
+        limit: Most records to add
+
+    Returns:
+        Number of cases added
+    """
+    from server.store import ExtractionStore
+
+    store = ExtractionStore(db_path)
+    known = set()
+    if os.path.exists(path):
+        known = {case['name'] for case in load_cases(path)}
+
+    added = 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        for record in store.find(limit=limit):
+            name = f"record-{record['record_id']}"
+            ocr_text = store.get_ocr_text(record['record_id'])
+            if name in known or not ocr_text:
+                continue
+            expected = {field: record.get(field) or '' for field in PARSER_FIELDS}
+            f.write(json.dumps({'name': name, 'ocr_text': ocr_text, 'expected': expected}) + '\n')
+            added += 1
+    return added
+
+
+def main(argv=None):
+    """Run the corpus; returns the process exit code (1 on a regression)"""
+    parser = argparse.ArgumentParser(
+        prog='python -m server.corpus',
+        description='Check DataParser accuracy and speed against the golden corpus.')
+    parser.add_argument('--cases', default=CASES_PATH, help='Corpus JSONL file')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline report to compare against')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Parser processes (capped at the CPU count)')
+    parser.add_argument('--repeat', type=int, default=20, help='Parses per case for the throughput figure')
+    parser.add_argument('--accuracy-tolerance', type=float, default=0.0,
+                        help='Allowed drop in precision or recall per field')
+    parser.add_argument('--speed-tolerance', type=float, default=0.3,
+                        help='Allowed fractional drop in relative speed')
+    parser.add_argument('--no-speed', action='store_true', help="Don't fail on throughput (e.g. noisy shared runners)")
+    parser.add_argument('--update-baseline', action='store_true', help='Save this run as the new baseline')
+    parser.add_argument('--seed-from-store', type=int, metavar='N', default=0,
+                        help='First append up to N stored records to the corpus')
+    parser.add_argument('--db', default=EXTRACTION_DB_PATH, help='Extraction database for --seed-from-store')
+    args = parser.parse_args(argv)
+
+    if args.seed_from_store:
+        added = seed_from_store(args.db, args.cases, args.seed_from_store)
+        print(f"Added {added} case(s) to {args.cases}", flush=True)
+
+    if not os.path.exists(args.cases):
+        parser.error(f"Corpus not found: {args.cases}")
+    cases = load_cases(args.cases)
+    if not cases:
+        parser.error(f"Corpus is empty: {args.cases}")
+
+    report = evaluate(cases, args.workers, max(1, args.repeat))
+    print_report(report)
+
+    if args.update_baseline:
+        if len(cases) < MIN_BASELINE_CASES:
+            print(f"\nNot saving a baseline from {len(cases)} case(s); add real ones with --seed-from-store "
+                  f"until there are at least {MIN_BASELINE_CASES}", flush=True)
+            return 1
+        baseline = {key: report[key] for key in ('cases', 'fields', 'relative_speed')}
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2)
+            f.write('\n')
+        print(f"\nBaseline saved to {args.baseline}", flush=True)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one", flush=True)
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, args.accuracy_tolerance,
+                          None if args.no_speed else args.speed_tolerance)
+    if regressions:
+        print("\nREGRESSIONS:", flush=True)
+        for message in regressions:
+            print(f"  {message}", flush=True)
+        return 1
+
+    print("\nNo regressions against the baseline", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.exit(main())
@@ -88,19 +88,37 @@ class DataParser:
             return match.group(1).strip()
         return None
 
-    def parse_text(self, text: str) -> Dict[str, str]:
+    def clean_odometer(self, odometer: Optional[str]) -> Optional[str]:
+        """Remove commas and spaces from an odometer reading"""
+        if odometer:
+            return odometer.replace(',', '').replace(' ', '').strip()
+        return odometer
+
+    def clean_vin(self, vin: Optional[str]) -> Optional[str]:
+        """Fix common OCR mistakes in a VIN"""
+        if vin:
+            # Remove spaces and dashes first, then replace O with 0
+            vin = vin.replace(' ', '').replace('-', '').replace('O', '0')
+            # VINs don't contain I, O, or Q - replace common OCR errors
+            vin = vin.replace('I', '1').replace('Q', '0')
+        return vin
+
+    def clean_engine_no(self, engine_no: Optional[str]) -> Optional[str]:
+        """Fix common OCR mistakes in an engine number (O -> 0)"""
+        if engine_no:
+            return engine_no.replace('O', '0')
+        return engine_no
+
+    def extract_identifiers(self, text: str) -> Dict[str, str]:
         """
-        Parse OCR text and extract all vehicle data fields
+        Extract the labelled identifier fields (MTA, odometer, engine, VIN, rego)
 
         Args:
-            text: OCR extracted text
+            text: Cleaned OCR text
 
         Returns:
-            Dictionary with extracted fields
+            Dictionary with identifier fields
         """
-        # Clean text
-        text = self.clean_text(text)
-
         # Extract simple fields
         data = {
             'mta': self.extract_field(text, self.patterns['mta']),
@@ -121,139 +139,242 @@ class DataParser:
                 data['vin'] = fallback_match.group(1)
 
         # Clean odometer (remove commas and spaces)
-        if data['odometer']:
-            data['odometer'] = data['odometer'].replace(',', '').replace(' ', '').strip()
+        data['odometer'] = self.clean_odometer(data['odometer'])
 
         # Fix common OCR mistakes in VIN and engine number (O -> 0)
         # Only apply to these fields to avoid breaking text matching elsewhere
-        if data['vin']:
-            # Remove spaces and dashes first, then replace O with 0
-            data['vin'] = data['vin'].replace(' ', '').replace('-', '').replace('O', '0')
-            # VINs don't contain I, O, or Q - replace common OCR errors
-            data['vin'] = data['vin'].replace('I', '1').replace('Q', '0')
-        if data['engine_no']:
-            data['engine_no'] = data['engine_no'].replace('O', '0')
-
-        # Try to parse vehicle description
-        # First, let's find the vehicle description line more flexibly
-        vehicle_desc_pattern = r'(\d{2}/\d{2})\s*-\s*(\d{2}/\d{2})\s+(.+?)(?=\n|$)'
-        desc_match = re.search(vehicle_desc_pattern, text)
+        data['vin'] = self.clean_vin(data['vin'])
+        data['engine_no'] = self.clean_engine_no(data['engine_no'])
 
-        if desc_match:
-            desc_line = desc_match.group(3)
-
-            # Parse components from description
-            # Year is from the date
-            data['year'] = desc_match.group(1)
-
-            # Split description line into parts
-            parts = desc_line.split()
-
-            # Extract Make (usually first word)
-            if len(parts) > 0:
-                data['make'] = parts[0]
-
-            # Extract Model - improved logic to handle various formats
-            model_parts = []
-            type_keywords = ['SEDAN', 'HATCH', 'HATCHBACK', 'WAGON', 'UTE', 'UTILITY', 'SUV', 'COUPE',
-                           'VAN', 'CONVERTIBLE', 'CABRIOLET', 'CAB', 'CHASSIS', 'CHAS']
-            badge_keywords = ['NEO', 'SPORT', 'BK', 'MY', 'GL', 'GX', 'SP', 'LIMITED', 'MAXX',
-                             'VTI', 'SX', 'VX', 'LS', 'LT', 'LTZ', 'RS', 'SV', 'ST', 'TI', 'ACTIVE',
-                             'X', 'S', 'SE', 'XE', 'XT', 'XR', 'XLS', 'SR', 'SL', 'DX', 'EX',
-                             'ASCENT', 'CONQUEST', 'CLASSIC', 'ELEGANCE', 'LUXURY', 'PREMIUM']
-
-            # Get just the model - stop at first badge or type keyword
-            for i, part in enumerate(parts[1:], 1):
-                part_upper = part.upper()
-
-                # Stop if we hit a single letter badge (X, S, etc) but allow numbers in model
-                if len(part_upper) <= 2 and part_upper in badge_keywords:
-                    break
-                # Stop if we hit a longer badge keyword
-                if len(part_upper) > 2 and any(part_upper == badge for badge in badge_keywords):
-                    break
-                # Stop if we hit a type keyword (like 4D, SEDAN, etc)
-                if any(keyword in part_upper for keyword in type_keywords):
-                    break
-                # Stop if we hit a number followed by D (like 4D)
-                if re.match(r'\d+D', part_upper):
-                    break
-                # Stop at "MULTI" or "POINT" (engine description)
-                if part_upper in ['MULTI', 'POINT', 'F/INJ']:
-                    break
-
-                model_parts.append(part)
-
-            # Clean up model name - just the base model
-            model_name = ' '.join(model_parts) if model_parts else ""
-            # Add space between letters and numbers (e.g., "MAZDA3" -> "MAZDA 3", "FORESTER" stays "FORESTER")
-            model_name = re.sub(r'([A-Z]+)(\d+)', r'\1 \2', model_name)
-            data['model'] = model_name.title()  # Capitalize properly
-
-            # Extract type - expanded to match all requested body types
-            # Patterns: "4DR Sedan", "3DR Hatch", "Single Cab", "C/Chassis", "Double Cab P/Up", etc.
-            type_patterns = [
-                r'\d+DR\s+(?:Sedan|Hatch|Hatchback|Cabriolet|Convertible)',  # 3DR Hatch, 4DR Sedan, etc.
-                r'(?:Single|Dual|Double)\s+Cab(?:\s+P/Up)?',  # Single Cab, Dual Cab, Double Cab P/Up
-                r'C/(?:Chassis|Chas)',  # C/Chassis, C/Chas
-                r'\d+D\s+(?:SEDAN|HATCH|WAGON|COUPE|CONVERTIBLE)',  # 4D SEDAN (legacy format)
-                r'(?:Wagon|Ute|Utility|Coupe)',  # Standalone types
-            ]
-
-            type_found = None
-            for pattern in type_patterns:
-                type_match = re.search(pattern, desc_line, re.IGNORECASE)
-                if type_match:
-                    type_found = type_match.group(0)
-                    break
-
-            data['type'] = type_found.title() if type_found else ''
-
-            # Extract transmission
-            if 'MANUAL' in desc_line.upper():
-                data['transmission'] = 'Manual'
-            elif 'AUTO' in desc_line.upper():
-                data['transmission'] = 'Auto'
-            else:
-                data['transmission'] = ''
-
-            # Extract color - look in multiple places
-            # Common OCR misreads: MARINE->MAROON, GRAN->GREY, etc.
-            color_map = {
-                'MARINE': 'Maroon',
-                'GRAN': 'Grey'
-            }
+        return data
 
-            # Search in the full text after the vehicle description line
-            full_desc_with_next_line = text[desc_match.start():]
+    def parse_description(self, text: str) -> Dict[str, str]:
+        """
+        Find the vehicle description line and parse it
 
-            # Extended color list including common variations
-            color_pattern = r'\b(GREY|GRAY|BLACK|WHITE|BLUE|RED|SILVER|GOLD|BRONZE|BEIGE|TAN|CREAM|CHAMPAGNE|GREEN|YELLOW|ORANGE|BROWN|PURPLE|MAROON|BURGUNDY|PINK|MARINE|GRAN)\b'
-            color_match = re.search(color_pattern, full_desc_with_next_line, re.IGNORECASE)
+        Args:
+            text: Cleaned OCR text
 
-            if color_match:
-                color_found = color_match.group(1).upper()
-                # Map common OCR mistakes to correct colors
-                data['color'] = color_map.get(color_found, color_found.capitalize())
-            else:
-                data['color'] = ''
+        Returns:
+            Dictionary with year, make, model, type, transmission and color
+        """
+        # First, let's find the vehicle description line more flexibly
+        vehicle_desc_pattern = r'(\d{2}/\d{2})\s*-\s*(\d{2}/\d{2})\s+(.+?)(?=\n|$)'
+        desc_match = re.search(vehicle_desc_pattern, text)
 
-        else:
+        if not desc_match:
             # If vehicle description parsing fails, set defaults
-            data.update({
+            return {
                 'year': '',
                 'make': '',
                 'model': '',
                 'type': '',
                 'transmission': '',
                 'color': ''
-            })
+            }
+
+        # Year is from the date; colour may sit on the line after the description
+        return self.parse_description_line(desc_match.group(3), desc_match.group(1),
+                                           text[desc_match.start():])
+
+    def parse_description_line(self, desc_line: str, year: str = '', color_text: str = None) -> Dict[str, str]:
+        """
+        Parse make, model, body type, transmission and colour from a description line
+
+        Args:
+            desc_line: Description text after the date range (e.g. "MAZDA MAZDA3 NEO ...")
+            year: Year taken from the date range
+            color_text: Text to search for the colour (defaults to desc_line)
+
+        Returns:
+            Dictionary with year, make, model, type, transmission and color
+        """
+        data = {'year': year}
+
+        # Split description line into parts
+        parts = desc_line.split()
+
+        # Extract Make (usually first word)
+        if len(parts) > 0:
+            data['make'] = parts[0]
+
+        # Extract Model - improved logic to handle various formats
+        model_parts = []
+        type_keywords = ['SEDAN', 'HATCH', 'HATCHBACK', 'WAGON', 'UTE', 'UTILITY', 'SUV', 'COUPE',
+                       'VAN', 'CONVERTIBLE', 'CABRIOLET', 'CAB', 'CHASSIS', 'CHAS']
+        badge_keywords = ['NEO', 'SPORT', 'BK', 'MY', 'GL', 'GX', 'SP', 'LIMITED', 'MAXX',
+                         'VTI', 'SX', 'VX', 'LS', 'LT', 'LTZ', 'RS', 'SV', 'ST', 'TI', 'ACTIVE',
+                         'X', 'S', 'SE', 'XE', 'XT', 'XR', 'XLS', 'SR', 'SL', 'DX', 'EX',
+                         'ASCENT', 'CONQUEST', 'CLASSIC', 'ELEGANCE', 'LUXURY', 'PREMIUM']
+
+        # Get just the model - stop at first badge or type keyword
+        for i, part in enumerate(parts[1:], 1):
+            part_upper = part.upper()
+
+            # Stop if we hit a single letter badge (X, S, etc) but allow numbers in model
+            if len(part_upper) <= 2 and part_upper in badge_keywords:
+                break
+            # Stop if we hit a longer badge keyword
+            if len(part_upper) > 2 and any(part_upper == badge for badge in badge_keywords):
+                break
+            # Stop if we hit a type keyword (like 4D, SEDAN, etc)
+            if any(keyword in part_upper for keyword in type_keywords):
+                break
+            # Stop if we hit a number followed by D (like 4D)
+            if re.match(r'\d+D', part_upper):
+                break
+            # Stop at "MULTI" or "POINT" (engine description)
+            if part_upper in ['MULTI', 'POINT', 'F/INJ']:
+                break
+
+            model_parts.append(part)
+
+        # Clean up model name - just the base model
+        model_name = ' '.join(model_parts) if model_parts else ""
+        # Add space between letters and numbers (e.g., "MAZDA3" -> "MAZDA 3", "FORESTER" stays "FORESTER")
+        model_name = re.sub(r'([A-Z]+)(\d+)', r'\1 \2', model_name)
+        data['model'] = model_name.title()  # Capitalize properly
+
+        # Extract type - expanded to match all requested body types
+        # Patterns: "4DR Sedan", "3DR Hatch", "Single Cab", "C/Chassis", "Double Cab P/Up", etc.
+        type_patterns = [
+            r'\d+DR\s+(?:Sedan|Hatch|Hatchback|Cabriolet|Convertible)',  # 3DR Hatch, 4DR Sedan, etc.
+            r'(?:Single|Dual|Double)\s+Cab(?:\s+P/Up)?',  # Single Cab, Dual Cab, Double Cab P/Up
+            r'C/(?:Chassis|Chas)',  # C/Chassis, C/Chas
+            r'\d+D\s+(?:SEDAN|HATCH|WAGON|COUPE|CONVERTIBLE)',  # 4D SEDAN (legacy format)
+            r'(?:Wagon|Ute|Utility|Coupe)',  # Standalone types
+        ]
+
+        type_found = None
+        for pattern in type_patterns:
+            type_match = re.search(pattern, desc_line, re.IGNORECASE)
+            if type_match:
+                type_found = type_match.group(0)
+                break
+
+        data['type'] = type_found.title() if type_found else ''
+
+        # Extract transmission
+        if 'MANUAL' in desc_line.upper():
+            data['transmission'] = 'Manual'
+        elif 'AUTO' in desc_line.upper():
+            data['transmission'] = 'Auto'
+        else:
+            data['transmission'] = ''
+
+        # Extract color - look in multiple places
+        # Common OCR misreads: MARINE->MAROON, GRAN->GREY, etc.
+        color_map = {
+            'MARINE': 'Maroon',
+            'GRAN': 'Grey'
+        }
+
+        # Search in the full text after the vehicle description line
+        full_desc_with_next_line = color_text if color_text is not None else desc_line
+
+        # Extended color list including common variations
+        color_pattern = r'\b(GREY|GRAY|BLACK|WHITE|BLUE|RED|SILVER|GOLD|BRONZE|BEIGE|TAN|CREAM|CHAMPAGNE|GREEN|YELLOW|ORANGE|BROWN|PURPLE|MAROON|BURGUNDY|PINK|MARINE|GRAN)\b'
+        color_match = re.search(color_pattern, full_desc_with_next_line, re.IGNORECASE)
+
+        if color_match:
+            color_found = color_match.group(1).upper()
+            # Map common OCR mistakes to correct colors
+            data['color'] = color_map.get(color_found, color_found.capitalize())
+        else:
+            data['color'] = ''
+
+        return data
+
+    def parse_text(self, text: str) -> Dict[str, str]:
+        """
+        Parse OCR text and extract all vehicle data fields
+
+        Args:
+            text: OCR extracted text
+
+        Returns:
+            Dictionary with extracted fields
+        """
+        # Clean text
+        text = self.clean_text(text)
+
+        data = self.extract_identifiers(text)
+
+        # Try to parse vehicle description
+        data.update(self.parse_description(text))
 
         # Validate and clean data
         data = self.validate_data(data)
 
         return data
 
+    def reparse(self, edits: Dict[str, str], current: Dict[str, str] = None,
+                ocr_text: str = None) -> Dict[str, str]:
+        """
+        Re-derive only the fields affected by user edits
+
+        Supported edits:
+            description: a corrected vehicle description line; re-runs the
+                description stage (year, make, model, type, transmission, color)
+            ocr_text: corrected OCR text; re-runs every stage
+            vin, engine_no, odometer: re-cleaned and re-validated
+            any other field: taken as-is
+
+        With no edits, every stage is re-run on ocr_text (e.g. after a parser fix).
+
+        Args:
+            edits: Dictionary of edited fields
+            current: Current values of the record
+            ocr_text: Stored OCR text for the record
+
+        Returns:
+            Dictionary of fields whose value changed ('' for a cleared warning)
+
+        Raises:
+            ValueError: If an edited value is not a string
+        """
+        for field, value in edits.items():
+            if value is not None and not isinstance(value, str):
+                raise ValueError(f"Edited value for {field} must be a string")
+
+        current = dict(current or {})
+        updated = dict(current)
+
+        for field, value in edits.items():
+            if field in ('description', 'ocr_text'):
+                continue
+            updated[field] = value.upper().replace(' ', '') if field in ('vin', 'engine_no') and value else value
+
+        if 'ocr_text' in edits or (not edits and ocr_text):
+            updated.update(self.parse_text(edits.get('ocr_text', ocr_text)))
+
+        if edits.get('description'):
+            description = self.clean_text(edits['description'])
+            parsed = self.parse_description(description)
+            if not parsed['make']:
+                # No date range on the edited line: parse it as a bare description
+                parsed = self.parse_description_line(description, updated.get('year', ''))
+            updated.update(parsed)
+
+        if 'vin' in edits:
+            updated['vin'] = self.clean_vin(updated['vin'])
+        if 'engine_no' in edits:
+            updated['engine_no'] = self.clean_engine_no(updated['engine_no'])
+        if 'odometer' in edits:
+            updated['odometer'] = self.clean_odometer(updated['odometer'])
+
+        # Validation recomputes derived values such as vin_warning
+        updated.pop('vin_warning', None)
+        updated = self.validate_data(updated)
+
+        changed = {
+            field: value for field, value in updated.items()
+            if (current.get(field) or '') != (value or '')
+        }
+        if current.get('vin_warning') and 'vin_warning' not in updated:
+            changed['vin_warning'] = ''
+        return changed
+
     def validate_data(self, data: Dict[str, str]) -> Dict[str, str]:
         """Validate and clean extracted data"""
         # Ensure all expected fields exist
@@ -0,0 +1,85 @@
+"""
+Deduplication Module
+Content hashing and normalized vehicle keys for spotting repeated uploads
+"""
+
+import hashlib
+import re
+from typing import Dict, List, Optional
+
+
+def content_hash(file_path: str) -> str:
+    """
+    Hash a file's bytes
+
+    Args:
+        file_path: Path to file
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_vin(vin) -> str:
+    """Normalize a VIN for comparison (uppercase alphanumerics, O/I/Q mapped like the parser does)"""
+    if not vin:
+        return ''
+    vin = re.sub(r'[^A-Z0-9]', '', str(vin).upper())
+    return vin.replace('O', '0').replace('I', '1').replace('Q', '0')
+
+
+def normalize_mta(mta) -> str:
+    """Normalize an MTA/stock number for comparison (digits only)"""
+    if not mta:
+        return ''
+    return re.sub(r'\D', '', str(mta))
+
+
+def vehicle_key(data: Dict) -> Optional[tuple]:
+    """
+    Return the identity used to decide whether two records are the same vehicle
+
+    A full 17-character VIN wins; otherwise the MTA/stock number is used.
+
+    Args:
+        data: Extracted data dictionary
+
+    Returns:
+        ('vin', value), ('mta', value), or None if neither is usable
+    """
+    vin = normalize_vin(data.get('vin'))
+    if len(vin) == 17:
+        return ('vin', vin)
+    mta = normalize_mta(data.get('mta'))
+    if mta:
+        return ('mta', mta)
+    return None
+
+
+def dedupe_records(data_list: List[Dict]) -> List[Dict]:
+    """
+    Drop records for vehicles already seen earlier in the list
+
+    Records without a usable VIN or MTA are always kept.
+
+    Args:
+        data_list: List of data dictionaries
+
+    Returns:
+        List with the first record for each vehicle, in original order
+    """
+    seen = set()
+    unique = []
+    for data in data_list:
+        key = vehicle_key(data)
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        unique.append(data)
+    return unique
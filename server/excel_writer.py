@@ -0,0 +1,73 @@
+"""
+Excel Writer Module
+Builds the inspection data spreadsheet one vehicle row at a time
+"""
+
+from typing import Dict
+
+# Column headers and the data key written under each one
+COLUMNS = [
+    ('Vendor', 'seller_name'),
+    ('Source File', 'source_filename'),
+    ('Stock #', 'mta'),
+    ('Year', 'year'),
+    ('Make', 'make'),
+    ('Model', 'model'),
+    ('Body', 'type'),
+    ('Auto/Man', 'transmission'),
+    ('Colour', 'color'),
+    ('Engine No', 'engine_no'),
+    ('VIN', 'vin'),
+    ('Registration', 'reg'),
+    ('Registration Expiry', 'rego_expiry'),
+    ('Odometer', 'odometer')
+]
+
+
+class InspectionWorkbook:
+    """Inspection data sheet with styled headers and auto-sized columns"""
+
+    def __init__(self):
+        """Create the workbook and write the header row"""
+        import openpyxl
+        from openpyxl.styles import Font, Alignment, PatternFill
+
+        self.workbook = openpyxl.Workbook()
+        self.sheet = self.workbook.active
+        self.sheet.title = "Inspection Data"
+        self.rows = 1
+
+        # Longest value seen in each column, tracked as rows are added
+        self.widths = [len(header) for header, _ in COLUMNS]
+
+        for col, (header, _) in enumerate(COLUMNS, 1):
+            cell = self.sheet.cell(row=1, column=col, value=header)
+            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+            cell.font = Font(bold=True, color="FFFFFF")
+            cell.alignment = Alignment(horizontal='center', vertical='center')
+
+    def add_row(self, data: Dict[str, str]):
+        """
+        Append one vehicle
+
+        Args:
+            data: Data dictionary or VehicleRecord (with seller_name)
+        """
+        self.rows += 1
+        for col, (_, key) in enumerate(COLUMNS, 1):
+            value = data.get(key, '')
+            self.sheet.cell(row=self.rows, column=col, value=value)
+            self.widths[col - 1] = max(self.widths[col - 1], len(str(value)))
+
+    def save(self, output):
+        """
+        Size the columns and write the workbook
+
+        Args:
+            output: Path or writable binary file object
+        """
+        from openpyxl.utils import get_column_letter
+
+        for col, width in enumerate(self.widths, 1):
+            self.sheet.column_dimensions[get_column_letter(col)].width = min(width + 2, 50)
+        self.workbook.save(output)
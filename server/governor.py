@@ -0,0 +1,278 @@
+"""
+Memory Governor Module
+Holds back new OCR and rendering work while the server is near its memory limit, instead of being OOM-killed
+"""
+
+import asyncio
+import gc
+import os
+import threading
+import time
+
+
+def current_rss():
+    """
+    Resident set size of this process
+
+    Returns:
+        Bytes, or None if it can't be read on this platform
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return None
+
+
+def cgroup_memory():
+    """
+    Memory charged to this process's cgroup (the container, when there is one)
+
+    Covers every worker and the Tesseract, Poppler and render processes they start.
+    Reclaimable page cache (inactive_file) is left out, as `docker stats` does.
+
+    Returns:
+        Bytes, or None outside a cgroup with memory accounting
+    """
+    try:
+        with open('/proc/self/cgroup') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+
+    for line in lines:
+        hierarchy, controllers, path = (line.split(':', 2) + ['', ''])[:3]
+        if hierarchy == '0' and not controllers:
+            # cgroup v2; the root cgroup has no memory.current
+            mount, usage_file, stat_key = '/sys/fs/cgroup', 'memory.current', 'inactive_file'
+        elif 'memory' in controllers.split(','):
+            # cgroup v1
+            mount, usage_file, stat_key = '/sys/fs/cgroup/memory', 'memory.usage_in_bytes', 'total_inactive_file'
+        else:
+            continue
+        # Without a cgroup namespace the path is the host's; the container's own group is then mounted at the root
+        for folder in (os.path.join(mount, path.lstrip('/')), mount):
+            try:
+                with open(os.path.join(folder, usage_file)) as f:
+                    usage = int(f.read())
+                break
+            except (OSError, ValueError):
+                continue
+        else:
+            continue
+        try:
+            with open(os.path.join(folder, 'memory.stat')) as f:
+                for stat in f:
+                    key, _, value = stat.partition(' ')
+                    if key == stat_key:
+                        usage -= int(value)
+                        break
+        except (OSError, ValueError):
+            pass
+        return max(0, usage)
+    return None
+
+
+def process_tree_rss():
+    """
+    Resident set size of this process plus every process it started
+
+    Returns:
+        Bytes, or None if it can't be read on this platform
+    """
+    pid = os.getpid()
+    try:
+        children = {}
+        rss = {}
+        page_size = os.sysconf('SC_PAGE_SIZE')
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # The command name may contain spaces; fields after it are fixed
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+                with open(f'/proc/{entry}/statm') as f:
+                    rss[int(entry)] = int(f.read().split()[1]) * page_size
+            except (OSError, ValueError, IndexError):
+                continue  # Exited while we were looking
+            children.setdefault(ppid, []).append(int(entry))
+        if pid in rss:
+            total, pending = 0, [pid]
+            while pending:
+                current = pending.pop()
+                total += rss.get(current, 0)
+                pending.extend(children.get(current, ()))
+            return total
+    except (OSError, ValueError):
+        pass
+
+    try:
+        import psutil
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+    except Exception:
+        return current_rss()
+
+
+def memory_in_use():
+    """
+    Memory the governor compares with its limit: the cgroup's usage when the
+    server runs in one, otherwise this process and its children
+
+    Returns:
+        Bytes, or None if neither can be read
+    """
+    usage = cgroup_memory()
+    return usage if usage is not None else process_tree_rss()
+
+
+def peak_rss():
+    """Highest resident set size of this process so far, in bytes (None if unknown)"""
+    try:
+        import resource
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except Exception:
+        return None
+
+
+def release_memory():
+    """Collect garbage and hand freed heap pages back to the OS (glibc only)"""
+    gc.collect()
+    try:
+        import ctypes
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except Exception:
+        pass
+
+
+class MemoryPressure(Exception):
+    """Raised when memory stayed above the limit for the whole wait"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class MemoryGovernor:
+    """
+    Throttles new work on memory in use (see memory_in_use())
+
+    Call wait_for_headroom() before starting a memory-hungry step (rasterizing
+    and OCR'ing a page, rendering a batch), and before taking any slot other
+    work queues on. Below the soft limit it returns at once; above it, garbage
+    is collected and the caller waits for running work to finish and free
+    memory, up to max_wait seconds.
+
+    Python rarely returns its heap to the OS after a spike, so a worker that
+    stays over the limit on its own refuses work until it is restarted; pair
+    the limit with worker recycling (gunicorn max_requests, see gunicorn.conf.py).
+    """
+
+    def __init__(self, soft_limit_bytes=0, max_wait=30.0, poll_interval=0.25):
+        """
+        Initialize governor
+
+        Args:
+            soft_limit_bytes: Memory in use above which new work waits (0 disables the governor)
+            max_wait: Seconds to wait before giving up with MemoryPressure
+            poll_interval: Seconds between memory checks while waiting
+        """
+        self.soft_limit = max(0, soft_limit_bytes)
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self.throttled = 0
+        self.refused = 0
+
+    def reset_locks(self):
+        """Replace the lock inherited from a parent process after fork"""
+        self._lock = threading.Lock()
+
+    def over_limit(self):
+        """True if the governor is on and memory in use is at or above the soft limit"""
+        if not self.soft_limit:
+            return False
+        usage = memory_in_use()
+        return usage is not None and usage >= self.soft_limit
+
+    def _start_wait(self):
+        """Count a throttled caller and free what we can; returns the wait's start time"""
+        with self._lock:
+            self.throttled += 1
+        release_memory()
+        return time.monotonic()
+
+    def _check_wait(self, started):
+        """Raise MemoryPressure once a wait has run out"""
+        if time.monotonic() - started >= self.max_wait:
+            with self._lock:
+                self.refused += 1
+            raise MemoryPressure('Server is low on memory', max(1, round(self.max_wait)))
+
+    def _end_wait(self, started):
+        """Log how long a wait that found headroom took"""
+        print(f"Waited {time.monotonic() - started:.1f}s for memory below "
+              f"{self.soft_limit // (1024 * 1024)} MB", flush=True)
+
+    def wait_for_headroom(self):
+        """
+        Block until memory in use is below the soft limit
+
+        Raises:
+            MemoryPressure: If memory is still over the limit after max_wait seconds
+        """
+        if not self.over_limit():
+            return
+
+        started = self._start_wait()
+        while self.over_limit():
+            self._check_wait(started)
+            time.sleep(self.poll_interval)
+        self._end_wait(started)
+
+    async def wait_for_headroom_async(self):
+        """
+        Wait on the event loop until memory in use is below the soft limit
+
+        Raises:
+            MemoryPressure: If memory is still over the limit after max_wait seconds
+        """
+        if not self.over_limit():
+            return
+
+        started = self._start_wait()
+        while self.over_limit():
+            self._check_wait(started)
+            await asyncio.sleep(self.poll_interval)
+        self._end_wait(started)
+
+    def stats(self):
+        """
+        Return memory figures for the health endpoint
+
+        Returns:
+            Dictionary of memory in use, this process's current/peak RSS and throttling counts
+        """
+        usage, rss, peak = memory_in_use(), current_rss(), peak_rss()
+        return {
+            'in_use_mb': round(usage / (1024 * 1024), 1) if usage is not None else None,
+            'rss_mb': round(rss / (1024 * 1024), 1) if rss is not None else None,
+            'peak_rss_mb': round(peak / (1024 * 1024), 1) if peak is not None else None,
+            'soft_limit_mb': self.soft_limit // (1024 * 1024) or None,
+            'throttled': self.throttled,
+            'refused': self.refused
+        }
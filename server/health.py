@@ -0,0 +1,138 @@
+"""
+Health Module
+Caches dependency probes for liveness checks and runs rate-limited OCR readiness checks
+"""
+
+import os
+import subprocess
+import threading
+import time
+
+
+class HealthMonitor:
+    """Tracks server capabilities without doing real work on every health request"""
+
+    def __init__(self, template_path, readiness_interval=60):
+        """
+        Initialize health monitor
+
+        Args:
+            template_path: Path to the Target.pdf template
+            readiness_interval: Minimum seconds between two OCR warm-up runs
+        """
+        self.template_path = template_path
+        self.readiness_interval = readiness_interval
+        self.capabilities = None
+        self._readiness = None
+        self._readiness_checked_at = 0.0
+        self._readiness_lock = threading.Lock()
+
+    def reset_locks(self):
+        """Replace locks inherited from a parent process after fork"""
+        self._readiness_lock = threading.Lock()
+
+    def _probe_command(self, command):
+        """
+        Run a version command and return (available, first line of output)
+
+        Args:
+            command: Command and arguments to run
+
+        Returns:
+            Tuple of (available, version string or error message)
+        """
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, timeout=5)
+            # pdftoppm prints its version to stderr
+            output = (result.stdout or result.stderr).strip()
+            version = output.split('\n')[0] if output else None
+            return result.returncode == 0, version
+        except Exception as e:
+            return False, f"Error: {str(e)}"
+
+    def probe_capabilities(self):
+        """
+        Probe Tesseract, Poppler and the template once and cache the result
+
+        Returns:
+            Dictionary of capability flags and versions
+        """
+        tesseract_available, tesseract_version = self._probe_command(['tesseract', '--version'])
+        poppler_available, poppler_version = self._probe_command(['pdftoppm', '-v'])
+
+        self.capabilities = {
+            'template_exists': os.path.exists(self.template_path),
+            'tesseract_available': tesseract_available,
+            'tesseract_version': tesseract_version,
+            'poppler_available': poppler_available,
+            'poppler_version': poppler_version,
+            'probed_at': time.time()
+        }
+        return self.capabilities
+
+    def liveness(self):
+        """
+        Return the cached capabilities for the liveness endpoint
+
+        Returns:
+            Dictionary with status and cached capability flags
+        """
+        if self.capabilities is None:
+            self.probe_capabilities()
+
+        return {'status': 'healthy', **self.capabilities}
+
+    def _run_warmup_ocr(self):
+        """
+        Run Tesseract on a tiny generated image
+
+        Returns:
+            Dictionary describing the warm-up result
+        """
+        import pytesseract
+        from PIL import Image, ImageDraw
+
+        started = time.perf_counter()
+        try:
+            image = Image.new('L', (240, 48), 255)
+            ImageDraw.Draw(image).text((10, 16), "MTA 220902", fill=0)
+            image = image.resize((960, 192))
+            text = pytesseract.image_to_string(image, config='--psm 7')
+            return {
+                'ready': True,
+                'ocr_text': text.strip(),
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+            }
+        except Exception as e:
+            return {
+                'ready': False,
+                'error': str(e),
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+            }
+
+    def readiness(self):
+        """
+        Run the OCR warm-up at most once per readiness_interval
+
+        Concurrent callers and callers inside the interval get the cached result.
+
+        Returns:
+            Dictionary describing the latest warm-up result
+        """
+        now = time.time()
+        if self._readiness is not None and now - self._readiness_checked_at < self.readiness_interval:
+            return {**self._readiness, 'cached': True}
+
+        if not self._readiness_lock.acquire(blocking=False):
+            # Another request is already running the warm-up
+            if self._readiness is not None:
+                return {**self._readiness, 'cached': True}
+            return {'ready': False, 'error': 'Readiness check in progress', 'cached': True}
+
+        try:
+            self._readiness = self._run_warmup_ocr()
+            self._readiness['checked_at'] = time.time()
+            self._readiness_checked_at = self._readiness['checked_at']
+            return {**self._readiness, 'cached': False}
+        finally:
+            self._readiness_lock.release()
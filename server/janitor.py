@@ -0,0 +1,254 @@
+"""
+Janitor Module
+Deletes expired uploads, temp files and generated output in a background thread
+"""
+
+import os
+import shutil
+import threading
+import time
+from collections import deque
+
+
+class FileJanitor:
+    """
+    Keeps a time-ordered index of created files and expires them by TTL and disk budget
+
+    With several server processes, only the one holding lock_path sweeps. It
+    rescans the folders before every sweep, so files the other processes
+    created count towards the disk ceiling too; when it exits, another process
+    takes over at its next interval.
+    """
+
+    def __init__(self, ttls, max_disk_bytes, interval=60, lock_path=None):
+        """
+        Initialize file janitor
+
+        Args:
+            ttls: Dictionary mapping each managed folder to its TTL in seconds
+            max_disk_bytes: Combined size ceiling for all managed folders
+            interval: Seconds between background sweeps
+            lock_path: File whose lock elects the sweeping process (None: every process sweeps);
+                keep it outside the managed folders
+        """
+        self.ttls = dict(ttls)
+        self.max_disk_bytes = max_disk_bytes
+        self.interval = interval
+        self.lock_path = lock_path
+        self._leading = False
+        self._lock_handle = None
+        # One deque per folder; entries are appended in creation order so the
+        # oldest artifact is always at the left
+        self._entries = {folder: deque() for folder in self.ttls}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def _path_size(self, path):
+        """Return the size of a file, or the total size of a directory tree"""
+        try:
+            if os.path.isdir(path):
+                total = 0
+                for root, _, files in os.walk(path):
+                    for name in files:
+                        try:
+                            total += os.path.getsize(os.path.join(root, name))
+                        except OSError:
+                            pass
+                return total
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def _folder_for(self, path):
+        """Return the managed folder containing path, or None"""
+        parent = os.path.dirname(os.path.abspath(path))
+        for folder in self.ttls:
+            if parent == os.path.abspath(folder):
+                return folder
+        return None
+
+    def track(self, path, created_at=None):
+        """
+        Add a newly created file or directory to the index (only kept by the sweeping
+        process; the others' files are found by its rescan)
+
+        Args:
+            path: Path directly inside one of the managed folders
+            created_at: Creation time (defaults to now)
+        """
+        folder = self._folder_for(path)
+        if folder is None or not self._leading:
+            return
+
+        size = self._path_size(path)
+        with self._lock:
+            self._entries[folder].append((created_at or time.time(), path, size))
+            self._total_bytes += size
+
+    def seed(self):
+        """Index files left on disk by earlier runs, oldest first (one scan at startup)"""
+        managed = {os.path.abspath(folder) for folder in self.ttls}
+        found = []
+        for folder in self.ttls:
+            try:
+                names = os.listdir(folder)
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(folder, name)
+                # A managed folder nested in another (temp/pages) is expired file by file
+                if os.path.abspath(path) in managed:
+                    continue
+                try:
+                    found.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass
+
+        with self._lock:
+            for folder in self._entries:
+                self._entries[folder].clear()
+            self._total_bytes = 0
+
+        for created_at, path in sorted(found):
+            self.track(path, created_at)
+
+    def _remove(self, path):
+        """Delete a file or directory, ignoring ones already removed"""
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error deleting {path}: {e}", flush=True)
+
+    def sweep(self, now=None):
+        """
+        Remove expired entries, then the oldest entries while over the disk ceiling
+
+        Args:
+            now: Current time (defaults to time.time())
+
+        Returns:
+            Number of entries removed
+        """
+        now = now or time.time()
+        expired = []
+
+        with self._lock:
+            for folder, entries in self._entries.items():
+                cutoff = now - self.ttls[folder]
+                while entries and entries[0][0] < cutoff:
+                    entry = entries.popleft()
+                    self._total_bytes -= entry[2]
+                    expired.append(entry[1])
+
+            # Evict globally oldest artifacts until under the ceiling
+            while self._total_bytes > self.max_disk_bytes:
+                heads = [entries for entries in self._entries.values() if entries]
+                if not heads:
+                    break
+                oldest = min(heads, key=lambda entries: entries[0][0])
+                entry = oldest.popleft()
+                self._total_bytes -= entry[2]
+                expired.append(entry[1])
+
+        # Filesystem work happens outside the lock so track() never waits on it
+        for path in expired:
+            self._remove(path)
+
+        return len(expired)
+
+    def _take_lead(self):
+        """
+        Try to become the process that sweeps; the lock is held until the process exits
+
+        Returns:
+            True if this process sweeps
+        """
+        if self._leading:
+            return True
+        if self.lock_path is None:
+            self._leading = True
+            return True
+
+        try:
+            import fcntl
+        except ImportError:
+            # No flock (Windows), where the development server is a single process
+            self._leading = True
+            return True
+
+        try:
+            handle = open(self.lock_path, 'a')
+        except OSError as e:
+            print(f"Janitor lock {self.lock_path} unavailable ({e}); sweeping from this process", flush=True)
+            self._leading = True
+            return True
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+
+        self._lock_handle = handle
+        self._leading = True
+        return True
+
+    def _run(self):
+        """Background loop"""
+        while not self._stop.wait(self.interval):
+            try:
+                if self._take_lead():
+                    # Files other processes created are on disk but not in this index
+                    self.seed()
+                    self.sweep()
+            except Exception as e:
+                print(f"Janitor sweep failed: {e}", flush=True)
+
+    def start(self):
+        """
+        Seed the index and start the background thread for this process
+
+        Safe to call again after fork: a thread started in another process is
+        not running here, so a new one is started. Call it in each worker, not
+        in a parent that forks afterwards, since children would share its lock.
+        """
+        if self._thread is not None and self._pid == os.getpid():
+            return
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._leading = False
+        self._lock_handle = None
+        if self._take_lead():
+            self.seed()
+            self.sweep()
+
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='file-janitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread"""
+        self._stop.set()
+
+    def stats(self):
+        """
+        Return index size information
+
+        Returns:
+            Dictionary with tracked entry count and bytes, and whether this process sweeps
+        """
+        with self._lock:
+            return {
+                'sweeping': self._leading,
+                'tracked_files': sum(len(entries) for entries in self._entries.values()),
+                'tracked_bytes': self._total_bytes,
+                'max_disk_bytes': self.max_disk_bytes
+            }
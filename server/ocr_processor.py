@@ -3,17 +3,33 @@ OCR Processor Module
 Handles text extraction from PDFs and images using Tesseract OCR
 """
 
-import pytesseract
-from PIL import Image
-from pdf2image import convert_from_path
 import io
 import os
+import re
+import subprocess
+import uuid
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.tiff', '.tif', '.bmp']
+
+# Separator between the text of consecutive pages
+PAGE_BREAK = '\n\n--- PAGE BREAK ---\n\n'
+
+# Once the text holds the vehicle description line ("03/08 - 03/08 MAZDA ...") and a
+# VIN, later pages add nothing DataParser reads
+VEHICLE_DESCRIPTION_PATTERN = re.compile(r'\d{2}/\d{2}\s*-\s*\d{2}/\d{2}\s+\S')
+VIN_PATTERN = re.compile(r'\b[A-Z0-9]{17}\b')
+
+
+def has_vehicle_block(text):
+    """True if OCR text already contains the vehicle description and a VIN"""
+    return bool(VEHICLE_DESCRIPTION_PATTERN.search(text) and VIN_PATTERN.search(text))
 
 
 class OCRProcessor:
     """Processes images and PDFs to extract text using OCR"""
 
-    def __init__(self, tesseract_config='--psm 6 --oem 3'):
+    def __init__(self, tesseract_config='--psm 6 --oem 3', detect_orientation=True, max_pages=0,
+                 stop_at_vehicle_block=False, dpi=300, max_image_pixels=0):
         """
         Initialize OCR processor
 
@@ -22,70 +38,305 @@ class OCRProcessor:
                 --psm 6: Assume uniform block of text (default)
                 --psm 4: Assume single column of text
                 --oem 3: Use both legacy and LSTM OCR engines
+            detect_orientation: Run Tesseract OSD to fix 90/180/270 degree rotations
+            max_pages: OCR at most this many pages of a PDF or multi-page TIFF (0 = all)
+            stop_at_vehicle_block: Stop reading pages once the vehicle description
+                and VIN have been found; later pages are never rasterized
+            dpi: Resolution PDF pages are rasterized at
+            max_image_pixels: Downscale photos and scans larger than this before OCR (0 = never)
         """
         self.config = tesseract_config
+        self.dpi = dpi
+        self.max_image_pixels = max(0, max_image_pixels or 0)
+        self.max_pages = max(0, max_pages or 0)
+        self.stop_at_vehicle_block = stop_at_vehicle_block
+        self.detect_orientation = detect_orientation
 
-    def preprocess_image(self, image):
+    def preprocess_page(self, page):
         """
-        Preprocess image for better OCR accuracy
+        Orient and clean up one page for OCR
+
+        A PageBuffer is read in place, since Tesseract's OSD reads its file.
+        Other images are copied into a scratch PageBuffer once when OSD needs
+        a file, instead of pytesseract encoding a PNG.
 
         Args:
-            image: PIL Image object
+            page: PIL Image object or PageBuffer
 
         Returns:
             Preprocessed PIL Image
         """
+        import pytesseract
         from PIL import ImageEnhance, ImageOps
+        from server.page_buffer import PageBuffer
 
-        # Auto-orient image based on EXIF data
-        try:
-            image = ImageOps.exif_transpose(image)
-        except:
-            pass
+        scratch = None
+        if not isinstance(page, PageBuffer):
+            # Auto-orient image based on EXIF data
+            try:
+                page = ImageOps.exif_transpose(page)
+            except:
+                pass
+
+            if self.detect_orientation:
+                page = scratch = PageBuffer.from_image(page)
 
-        # Try to detect and fix rotation using Tesseract's OSD (Orientation and Script Detection)
         try:
-            osd = pytesseract.image_to_osd(image)
-            rotation = int([line for line in osd.split('\n') if 'Rotate:' in line][0].split(':')[1].strip())
-            if rotation != 0:
-                image = image.rotate(-rotation, expand=True)
-                print(f"Auto-rotated image by {rotation} degrees", flush=True)
-        except Exception as e:
-            print(f"Could not detect rotation: {e}", flush=True)
+            image = page.image() if isinstance(page, PageBuffer) else page
+
+            # Try to detect and fix rotation using Tesseract's OSD (Orientation and Script Detection)
+            if self.detect_orientation:
+                try:
+                    osd = pytesseract.image_to_osd(page.path)
+                    rotation = int([line for line in osd.split('\n') if 'Rotate:' in line][0].split(':')[1].strip())
+                    if rotation != 0:
+                        image = image.rotate(-rotation, expand=True)
+                        print(f"Auto-rotated image by {rotation} degrees", flush=True)
+                except Exception as e:
+                    print(f"Could not detect rotation: {e}", flush=True)
+
+            # Convert to grayscale
+            if image.mode != 'L':
+                image = image.convert('L')
+
+            # Increase contrast
+            enhancer = ImageEnhance.Contrast(image)
+            image = enhancer.enhance(2.0)
+
+            # Increase sharpness
+            enhancer = ImageEnhance.Sharpness(image)
+            image = enhancer.enhance(1.5)
+
+            return image
+        finally:
+            if scratch is not None:
+                scratch.close()
+
+    def preprocess_image(self, image):
+        """
+        Preprocess image for better OCR accuracy
 
-        # Convert to grayscale
-        if image.mode != 'L':
-            image = image.convert('L')
+        Args:
+            image: PIL Image object or PageBuffer
 
-        # Increase contrast
-        enhancer = ImageEnhance.Contrast(image)
-        image = enhancer.enhance(2.0)
+        Returns:
+            Preprocessed PIL Image
+        """
+        return self.preprocess_page(image)
 
-        # Increase sharpness
-        enhancer = ImageEnhance.Sharpness(image)
-        image = enhancer.enhance(1.5)
+    def recognize_page(self, page):
+        """
+        Preprocess and OCR one page
 
+        The preprocessed page is written once to a mapped PGM file that
+        Tesseract reads directly (pytesseract would encode a PNG).
+
+        Args:
+            page: PIL Image object or PageBuffer
+
+        Returns:
+            Extracted text as string
+        """
+        import pytesseract
+        from server.page_buffer import PageBuffer
+
+        with PageBuffer.from_image(self.preprocess_page(page)) as buffer:
+            return pytesseract.image_to_string(buffer.path, config=self.config)
+
+    def page_limit(self, page_count):
+        """Number of pages to read out of page_count under max_pages"""
+        return min(page_count, self.max_pages) if self.max_pages else page_count
+
+    def fit_image(self, image):
+        """
+        Downscale an image to at most max_image_pixels, the photo equivalent of the PDF dpi
+
+        JPEGs are decoded straight at 1/2, 1/4 or 1/8 scale, so the full-size
+        photo is never held in memory; the reduction may land below the limit,
+        but never under half of it.
+
+        Args:
+            image: PIL Image object, not yet loaded
+
+        Returns:
+            PIL Image within the limit
+        """
+        from PIL import Image
+
+        pixels = image.width * image.height
+        if not self.max_image_pixels or pixels <= self.max_image_pixels:
+            return image
+
+        reduction = 1
+        while reduction < 8 and pixels / (reduction * 2) ** 2 >= self.max_image_pixels / 2:
+            reduction *= 2
+        if reduction > 1:
+            try:
+                image.draft(image.mode if image.mode in ('L', 'RGB') else 'RGB',
+                            (-(-image.width // reduction), -(-image.height // reduction)))
+            except Exception:
+                pass
+
+        if image.width * image.height > self.max_image_pixels:
+            scale = (self.max_image_pixels / (image.width * image.height)) ** 0.5
+            size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+            image = image.resize(size, Image.Resampling.BILINEAR)
         return image
 
-    def extract_text_from_image(self, image_path):
+    def iter_image_pages(self, image_path):
         """
-        Extract text from an image file
+        Yield the frames of an image file one at a time
+
+        Multi-page TIFFs are decoded frame by frame, so only the current page
+        is held in memory. Each frame is only valid until the next is requested.
 
         Args:
             image_path: Path to image file
 
+        Yields:
+            PIL Image for each page
+        """
+        from PIL import Image
+
+        with Image.open(image_path) as image:
+            for index in range(self.page_limit(getattr(image, 'n_frames', 1))):
+                image.seek(index)
+                yield self.fit_image(image)
+
+    def pdf_page_count(self, pdf_path):
+        """Number of pages in a PDF, from one pdfinfo run"""
+        from pdf2image import pdfinfo_from_path
+
+        return int(pdfinfo_from_path(pdf_path)['Pages'])
+
+    def rasterize_pdf(self, pdf_path, prefix, first_page, last_page=None, dpi=None):
+        """
+        Run pdftoppm once for a range of pages, writing grayscale PGM files
+
+        pdf2image's convert_from_path() would also run pdfinfo and `pdftoppm -v`
+        on every call.
+
+        Args:
+            pdf_path: Path to PDF file
+            prefix: Output path prefix; pages are written as PREFIX-N.pgm
+            first_page: First page to rasterize
+            last_page: Last page (None = end of document)
+            dpi: Rasterization resolution (defaults to the processor's dpi)
+
         Returns:
-            Extracted text as string
+            Paths of the page files, in page order
+
+        Raises:
+            RuntimeError: If pdftoppm is missing or fails
         """
+        command = ['pdftoppm', '-r', str(dpi or self.dpi), '-gray', '-f', str(first_page)]
+        if last_page is not None:
+            command += ['-l', str(last_page)]
         try:
-            # Open and preprocess image
-            image = Image.open(image_path)
-            image = self.preprocess_image(image)
+            result = subprocess.run(command + [pdf_path, prefix], capture_output=True, text=True)
+        except OSError as e:
+            raise RuntimeError(f"Could not run pdftoppm (is Poppler installed?): {e}")
+
+        # Page numbers are zero-padded to the width of the document's page count
+        folder, name = os.path.split(prefix)
+        pages = []
+        for entry in os.listdir(folder):
+            number = entry[len(name) + 1:-len('.pgm')]
+            if (entry.startswith(name + '-') and entry.endswith('.pgm') and number.isdigit()
+                    and first_page <= int(number) <= (last_page or int(number))):
+                pages.append((int(number), os.path.join(folder, entry)))
+        paths = [path for _, path in sorted(pages)]
+
+        if result.returncode != 0:
+            for path in paths:
+                os.remove(path)
+            raise RuntimeError(f"pdftoppm failed: {result.stderr.strip() or result.returncode}")
+        return paths
+
+    def iter_pdf_pages(self, pdf_path, dpi=None):
+        """
+        Rasterize a PDF's pages
+
+        Poppler writes each page as a grayscale PGM that is memory-mapped rather
+        than decoded, so the raster is never copied into Python. Without
+        stop_at_vehicle_block every page (up to max_pages) comes from a single
+        pdftoppm run; with it, the page count is read once and pages are
+        rasterized one pdftoppm run at a time, so pages after the caller stops
+        iterating are never rasterized.
+
+        Args:
+            pdf_path: Path to PDF file
+            dpi: Rasterization resolution (defaults to the processor's dpi)
 
-            # Extract text using Tesseract
-            text = pytesseract.image_to_string(image, config=self.config)
+        Yields:
+            PageBuffer for each page (closed by the caller)
+        """
+        from server.page_buffer import PageBuffer, default_folder
+
+        prefix = os.path.join(default_folder(), uuid.uuid4().hex)
+
+        if not self.stop_at_vehicle_block:
+            # Page files come back in page order; remove any the caller never took
+            paths = self.rasterize_pdf(pdf_path, prefix, 1, self.max_pages or None, dpi)
+            try:
+                while paths:
+                    yield PageBuffer(paths.pop(0), owner=True)
+            finally:
+                for path in paths:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            return
+
+        for page in range(1, self.page_limit(self.pdf_page_count(pdf_path)) + 1):
+            paths = self.rasterize_pdf(pdf_path, prefix, page, page, dpi)
+            if not paths:
+                return
+            yield PageBuffer(paths[0], owner=True)
+
+    def extract_text_from_pages(self, pages):
+        """
+        OCR pages in order, stopping early when the page policy allows
 
-            return text
+        Args:
+            pages: Iterator of PIL Images or PageBuffers (from iter_image_pages or iter_pdf_pages)
+
+        Returns:
+            Extracted text of the pages read, joined with PAGE_BREAK
+        """
+        from server.page_buffer import PageBuffer
+
+        all_text = []
+        try:
+            for page in pages:
+                try:
+                    all_text.append(self.recognize_page(page))
+                finally:
+                    # Unmap and delete a rasterized PDF page once it has been read
+                    if isinstance(page, PageBuffer):
+                        page.close()
+
+                if self.stop_at_vehicle_block and has_vehicle_block(PAGE_BREAK.join(all_text)):
+                    break
+        finally:
+            # Closes the file / skips rasterizing the remaining pages
+            pages.close()
+
+        return PAGE_BREAK.join(all_text)
+
+    def extract_text_from_image(self, image_path):
+        """
+        Extract text from an image file (every page of a multi-page TIFF)
+
+        Args:
+            image_path: Path to image file
+
+        Returns:
+            Extracted text as string
+        """
+        try:
+            return self.extract_text_from_pages(self.iter_image_pages(image_path))
         except Exception as e:
             raise Exception(f"Error extracting text from image: {str(e)}")
 
@@ -97,24 +348,10 @@ class OCRProcessor:
             pdf_path: Path to PDF file
 
         Returns:
-            Extracted text as string (all pages combined)
+            Extracted text as string (pages combined)
         """
         try:
-            # Convert PDF to images
-            images = convert_from_path(pdf_path, dpi=300)
-
-            # Extract text from each page
-            all_text = []
-            for i, image in enumerate(images):
-                # Preprocess image
-                image = self.preprocess_image(image)
-
-                # Extract text
-                text = pytesseract.image_to_string(image, config=self.config)
-                all_text.append(text)
-
-            # Combine all pages
-            return '\n\n--- PAGE BREAK ---\n\n'.join(all_text)
+            return self.extract_text_from_pages(self.iter_pdf_pages(pdf_path))
         except Exception as e:
             raise Exception(f"Error extracting text from PDF: {str(e)}")
 
@@ -133,7 +370,7 @@ class OCRProcessor:
 
         if file_ext == '.pdf':
             return self.extract_text_from_pdf(file_path)
-        elif file_ext in ['.jpg', '.jpeg', '.png', '.tiff', '.bmp']:
+        elif file_ext in IMAGE_EXTENSIONS:
             return self.extract_text_from_image(file_path)
         else:
             raise ValueError(f"Unsupported file type: {file_ext}")
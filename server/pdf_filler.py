@@ -3,27 +3,69 @@ PDF Filler Module
 Fills the Declaration and Contract of Sale PDF form with extracted data
 """
 
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from PyPDF2 import PdfReader, PdfWriter
 import io
 import os
+import threading
 from typing import Dict
 
+from server.dedup import dedupe_records
+from server.templates import DEFAULT_TEMPLATE, DeclarationTemplate, TemplateRegistry
+
 
 class PDFFiller:
     """Fills PDF declaration forms with vehicle data"""
 
-    def __init__(self, template_path):
+    def __init__(self, template_path=None, registry: TemplateRegistry = None):
         """
         Initialize PDF filler
 
         Args:
-            template_path: Path to the Target.pdf template
+            template_path: Path to the Target.pdf template (used when no registry is given)
+            registry: Templates to choose from per record (see server.templates)
+        """
+        if registry is None:
+            registry = TemplateRegistry()
+            registry.register(DEFAULT_TEMPLATE, template_path)
+        self.registry = registry
+        self.template_path = registry.get().pdf_path
+        self._pool = None
+        self._pool_pid = None
+        self._pool_workers = 0
+        self._pool_lock = threading.Lock()
+
+    def reset_locks(self):
+        """Replace the pool lock inherited from a parent process after fork"""
+        self._pool_lock = threading.Lock()
+
+    def preload(self):
+        """
+        Load every template and warm up ReportLab fonts once
+
+        Called before workers fork so every worker shares the parsed templates
+        and font metrics instead of loading them on its first request.
+        """
+        from reportlab.pdfbase import pdfmetrics
+
+        self.registry.preload()
+
+        # Font metrics are parsed lazily by ReportLab on first use
+        for template in self.registry.templates.values():
+            pdfmetrics.getFont(template.font)
+
+    def template_for(self, data: Dict[str, str]) -> DeclarationTemplate:
+        """
+        Return the template a record should be rendered with
+
+        Args:
+            data: Dictionary containing vehicle data (optionally with 'template')
+
+        Returns:
+            DeclarationTemplate (the registry default if the record names none)
         """
-        self.template_path = template_path
+        return self.registry.get(data.get('template'))
 
-    def create_overlay(self, data: Dict[str, str], page_size, seller: str = '') -> bytes:
+    def create_overlay(self, data: Dict[str, str], page_size, seller: str = '',
+                       template: DeclarationTemplate = None) -> bytes:
         """
         Create an overlay PDF with the filled data
 
@@ -31,102 +73,121 @@ class PDFFiller:
             data: Dictionary containing vehicle data
             page_size: Tuple of (width, height) for the page
             seller: Seller name to add after "We"
+            template: Template whose layout positions the fields (defaults to the record's)
 
         Returns:
             PDF bytes
         """
+        from reportlab.pdfgen import canvas
+
         packet = io.BytesIO()
         can = canvas.Canvas(packet, pagesize=page_size)
 
-        # Set font
-        can.setFont("Helvetica", 10)
-
-        # Seller name (after "We") - all caps, 4px bigger font
-        if seller:
-            can.setFont("Helvetica", 14)
-            can.drawString(65, 745, seller.upper())
-            can.setFont("Helvetica", 10)  # Reset to normal font
-
-        # Based on the example image, the layout is:
-        # Row 1: Year | Make | Model | Type | Auto/Man | Colour
-        # Row 2: Eng Number (boxes) | | | | | Rego Number | | Check Digit
-        # Row 3: VIN Number (boxes) | | | | | Rego Expires | KMS |
-        # Row 4: Stock Number | | | | | | Price | $
-
-        # First data row - based on correct Mazda example
-        y_row1 = 660
-
-        # Column X positions - halved spacing to match form boxes
-        x_col1 = 32     # Year column
-        x_col2 = 78     # Make column (was 138, now closer)
-        x_col3 = 172    # Model column (was 245)
-        x_col4 = 260    # Type column (was 365)
-        x_col5 = 317    # Auto/Man column (was 455)
-        x_col6 = 373    # Colour column (was 540)
-
-        # Row 1: Basic vehicle data
-        if data.get('year'):
-            can.drawString(x_col1, y_row1, str(data['year']))
-        if data.get('make'):
-            # Capitalize first letter, lowercase rest
-            can.drawString(x_col2, y_row1, str(data['make']).capitalize())
-        if data.get('model'):
-            can.drawString(x_col3, y_row1, str(data['model'])[:15])
-        if data.get('type'):
-            can.drawString(x_col4, y_row1, str(data['type']))
-        if data.get('transmission'):
-            # Capitalize first letter, lowercase rest
-            can.drawString(x_col5, y_row1, str(data['transmission']).capitalize())
-        if data.get('colour') or data.get('color'):
-            color = data.get('colour') or data.get('color')
-            # Capitalize first letter, lowercase rest
-            can.drawString(x_col6, y_row1, str(color).capitalize())
-
-        # Row 2: Engine Number (individual boxes) + Rego Number
-        y_row2 = y_row1 - 20
-        x_eng_start = 94  # Start position for first character
-        eng_box_width = 18.7  # Space between character boxes (wider based on example)
-
-        engine_no = data.get('engine_no', '')
-        for i, char in enumerate(engine_no[:12]):  # Limit to 12 chars that fit
-            can.drawString(x_eng_start + (i * eng_box_width), y_row2, char)
-
-        # Rego Number (right side of row 2) - 2px larger, moved up 2px
-        x_rego_num = 438
-        if data.get('reg'):
-            can.setFont("Helvetica", 12)
-            can.drawString(x_rego_num, y_row2 + 2, str(data['reg']))
-            can.setFont("Helvetica", 10)  # Reset to normal font
-
-        # Row 3: VIN Number (individual boxes) + Rego Expires + KMS
-        y_row3 = y_row1 - 47
-        x_vin_start = 112  # Match engine number start
-
-        vin = data.get('vin', '')
-        for i, char in enumerate(vin[:17]):  # 17 character VIN
-            can.drawString(x_vin_start + (i * eng_box_width), y_row3, char)
-
-        # Rego Expires (right side of row 3) - moved up 2px
-        x_rego_exp = 467
-        if data.get('rego_expiry'):
-            can.drawString(x_rego_exp, y_row3 + 3, str(data['rego_expiry']))
-
-        # KMS (far right of row 3) - moved up 2px
-        x_kms = 537
-        if data.get('odometer'):
-            can.drawString(x_kms, y_row3 + 3, str(data['odometer']))
-
-        # Row 4: Stock Number - 2px larger
-        y_row4 = y_row1 - 88
-        if data.get('mta'):
-            can.setFont("Helvetica", 12)
-            can.drawString(x_col1, y_row4, str(data['mta']))
-            can.setFont("Helvetica", 10)  # Reset to normal font
+        (template or self.template_for(data)).draw(can, data, seller)
 
         can.save()
         packet.seek(0)
         return packet.getvalue()
 
+    def render_page(self, data: Dict[str, str], seller: str = ''):
+        """
+        Merge a data overlay onto a fresh copy of the record's template page
+
+        Args:
+            data: Dictionary containing vehicle data
+            seller: Seller name
+
+        Returns:
+            PyPDF2 page object
+        """
+        from PyPDF2 import PdfReader
+
+        # Copy the preloaded template page
+        template = self.template_for(data)
+        page = template.page()
+
+        # Create overlay with data
+        overlay_bytes = self.create_overlay(data, template.page_size, seller, template)
+        overlay_pdf = PdfReader(io.BytesIO(overlay_bytes))
+
+        # Merge template and overlay
+        page.merge_page(overlay_pdf.pages[0])
+        return page
+
+    def render_pdf_bytes(self, data_list: list) -> bytes:
+        """
+        Render one or more declarations into a PDF held in memory
+
+        Args:
+            data_list: List of data dictionaries (each with seller_name)
+
+        Returns:
+            PDF bytes with one page per record
+        """
+        from PyPDF2 import PdfWriter
+
+        output = PdfWriter()
+        for data in data_list:
+            output.add_page(self.render_page(data, data.get('seller_name', '')))
+
+        buffer = io.BytesIO()
+        output.write(buffer)
+        return buffer.getvalue()
+
+    def _render_pool(self, workers: int):
+        """
+        Return this process's rendering pool, creating it on first use
+
+        The pool is kept between requests so workers load the templates once. It
+        uses 'spawn' so it is safe to start from a threaded gunicorn worker; the
+        lock keeps concurrent requests from each starting (and leaking) a pool.
+        """
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid() or self._pool_workers != workers:
+                if self._pool is not None and self._pool_pid == os.getpid():
+                    self._pool.shutdown(wait=False)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_render_worker,
+                    initargs=(self.registry.specs(),)
+                )
+                self._pool_pid = os.getpid()
+                self._pool_workers = workers
+            return self._pool
+
+    def render_batch(self, data_list: list, workers: int = 1, combine: bool = False) -> list:
+        """
+        Render declarations, in parallel across processes for large batches
+
+        Each worker process loads the template once, renders contiguous chunks
+        of data_list and returns PDF bytes; results come back in input order.
+
+        Args:
+            data_list: List of data dictionaries (each with seller_name)
+            workers: Number of rendering processes (1 renders in this process)
+            combine: Return one multi-page PDF per chunk instead of one PDF per record
+
+        Returns:
+            List of PDF bytes (per record, or per chunk when combine is True)
+        """
+        if workers <= 1 or len(data_list) < PARALLEL_MIN_BATCH:
+            if combine:
+                return [self.render_pdf_bytes(data_list)] if data_list else []
+            return [self.render_pdf_bytes([data]) for data in data_list]
+
+        # A few chunks per worker balances load without too much per-chunk overhead
+        chunk_size = max(1, -(-len(data_list) // (workers * 4)))
+        chunks = [data_list[i:i + chunk_size] for i in range(0, len(data_list), chunk_size)]
+
+        results = []
+        for chunk_result in self._render_pool(workers).map(_render_chunk, chunks, [combine] * len(chunks)):
+            results.extend(chunk_result)
+        return results
+
     def fill_form(self, data: Dict[str, str], output_path: str, seller: str = ''):
         """
         Fill the PDF form with data
@@ -136,23 +197,11 @@ class PDFFiller:
             output_path: Path where filled PDF should be saved
             seller: Seller name
         """
-        try:
-            # Read the template PDF
-            template_pdf = PdfReader(self.template_path)
-            page = template_pdf.pages[0]
+        from PyPDF2 import PdfWriter
 
-            # Get page dimensions
-            page_width = float(page.mediabox.width)
-            page_height = float(page.mediabox.height)
-
-            # Create overlay with data
-            overlay_bytes = self.create_overlay(data, (page_width, page_height), seller)
-            overlay_pdf = PdfReader(io.BytesIO(overlay_bytes))
-
-            # Merge template and overlay
+        try:
             output = PdfWriter()
-            page.merge_page(overlay_pdf.pages[0])
-            output.add_page(page)
+            output.add_page(self.render_page(data, seller))
 
             # Write output
             with open(output_path, 'wb') as output_file:
@@ -163,79 +212,171 @@ class PDFFiller:
         except Exception as e:
             raise Exception(f"Error filling PDF form: {str(e)}")
 
-    def fill_multiple_forms(self, data_list: list, output_dir: str) -> list:
+    def declaration_filename(self, data: Dict[str, str], index: int) -> str:
         """
-        Fill multiple PDF forms from a list of data
+        Name for a single declaration PDF
+
+        Args:
+            data: Dictionary containing vehicle data
+            index: Zero-based position of the record in the batch
+
+        Returns:
+            Filename including the .pdf extension
+        """
+        # Generate output filename (using Stock # which is the MTA number)
+        filename = f"SN_{index+1}"
+
+        # Use Stock # (MTA) or reg as filename if available
+        if data.get('mta'):
+            filename = f"SN_{data['mta']}"
+        elif data.get('reg'):
+            filename = f"SN_{data['reg']}"
+
+        return f"{filename}.pdf"
+
+    def declaration_names(self, data_list: list) -> list:
+        """
+        Name each declaration
+
+        Repeated stock numbers get a numeric suffix so every name is unique.
+        Callers drop repeat vehicles first (dedup.dedupe_records) so every
+        download holds the same declarations.
+
+        Args:
+            data_list: List of data dictionaries
+
+        Returns:
+            List of (position in data_list, filename) tuples
+        """
+        used = set()
+        names = []
+        for position, data in enumerate(data_list):
+            filename = self.declaration_filename(data, len(names))
+            # Different vehicles can share a stock number; keep every entry in the archive
+            stem, suffix = filename[:-4], 2
+            while filename in used:
+                filename = f"{stem}_{suffix}.pdf"
+                suffix += 1
+            used.add(filename)
+            names.append((position, filename))
+        return names
+
+    def render_named_pdfs(self, data_list: list, workers: int = 1) -> list:
+        """
+        Render one declaration per record, in memory
 
         Args:
             data_list: List of data dictionaries (each with seller_name)
-            output_dir: Directory where filled PDFs should be saved
+            workers: Number of rendering processes
 
         Returns:
-            List of output file paths
+            List of (filename, PDF bytes) tuples
         """
-        output_files = []
+        names = self.declaration_names(data_list)
+        pdfs = self.render_batch([data_list[position] for position, _ in names], workers)
+        return [(filename, pdf) for (_, filename), pdf in zip(names, pdfs)]
 
-        for i, data in enumerate(data_list):
-            # Generate output filename (using Stock # which is the MTA number)
-            filename = f"SN_{i+1}"
+    def render_bundle(self, data_list: list, workers: int = 1):
+        """
+        Render every declaration once and reuse it for both download formats
 
-            # Use Stock # (MTA) or reg as filename if available
-            if data.get('mta'):
-                filename = f"SN_{data['mta']}"
-            elif data.get('reg'):
-                filename = f"SN_{data['reg']}"
+        Each record's overlay is merged onto the template a single time. The
+        resulting page goes into the combined PDF (every record, in order) and
+        into its own PDF.
 
-            output_path = os.path.join(output_dir, f"{filename}.pdf")
+        Args:
+            data_list: List of data dictionaries (each with seller_name)
+            workers: Number of rendering processes
 
-            # Get seller name from the data itself
-            seller = data.get('seller_name', '')
+        Returns:
+            Tuple of (combined PDF bytes, list of (filename, PDF bytes))
+        """
+        from PyPDF2 import PdfReader, PdfWriter
+
+        names = self.declaration_names(data_list)
+
+        if workers <= 1 or len(data_list) < PARALLEL_MIN_BATCH:
+            pages = [self.render_page(data, data.get('seller_name', '')) for data in data_list]
+            singles = {}
+            for position, _ in names:
+                single = PdfWriter()
+                single.add_page(pages[position])
+                buffer = io.BytesIO()
+                single.write(buffer)
+                singles[position] = buffer.getvalue()
+        else:
+            # Workers return one PDF per record; the combined PDF reuses their pages
+            pdfs = self.render_batch(data_list, workers)
+            pages = [PdfReader(io.BytesIO(pdf)).pages[0] for pdf in pdfs]
+            singles = {position: pdfs[position] for position, _ in names}
+
+        combined = PdfWriter()
+        for page in pages:
+            combined.add_page(page)
+        buffer = io.BytesIO()
+        combined.write(buffer)
+
+        return buffer.getvalue(), [(filename, singles[position]) for position, filename in names]
+
+    def fill_multiple_forms(self, data_list: list, output_dir: str, workers: int = 1) -> list:
+        """
+        Fill multiple PDF forms from a list of data
+
+        Records for a vehicle (same VIN or MTA) already in the list are skipped,
+        so each vehicle gets exactly one declaration.
+
+        Args:
+            data_list: List of data dictionaries (each with seller_name)
+            output_dir: Directory where filled PDFs should be saved
+            workers: Number of rendering processes
+
+        Returns:
+            List of output file paths
+        """
+        output_files = []
 
-            # Fill the form
-            self.fill_form(data, output_path, seller)
+        for filename, pdf in self.render_named_pdfs(dedupe_records(data_list), workers):
+            output_path = os.path.join(output_dir, filename)
+            with open(output_path, 'wb') as output_file:
+                output_file.write(pdf)
             output_files.append(output_path)
 
         return output_files
 
-    def fill_single_multipage_pdf(self, data_list: list, output_path: str) -> str:
+    def fill_single_multipage_pdf(self, data_list: list, output_path: str, workers: int = 1) -> str:
         """
         Fill multiple declarations into a single multi-page PDF
 
         Args:
             data_list: List of data dictionaries (each with seller_name)
-            output_path: Path where the single multi-page PDF should be saved
+            output_path: Path where the single multi-page PDF should be saved,
+                or a writable binary file object
+            workers: Number of rendering processes
 
         Returns:
-            Output file path
+            Output file path (or the file object)
         """
-        try:
-            # Create output PDF writer
-            output = PdfWriter()
+        from PyPDF2 import PdfReader, PdfWriter
 
-            # Read template once
-            template_pdf = PdfReader(self.template_path)
-            template_page = template_pdf.pages[0]
-            page_width = float(template_page.mediabox.width)
-            page_height = float(template_page.mediabox.height)
-
-            # For each data entry, create a new page
-            for data in data_list:
-                # Create overlay with data
-                seller = data.get('seller_name', '')
-                overlay_bytes = self.create_overlay(data, (page_width, page_height), seller)
-                overlay_pdf = PdfReader(io.BytesIO(overlay_bytes))
-
-                # Create a fresh copy of the template page for each entry
-                template_pdf_fresh = PdfReader(self.template_path)
-                page = template_pdf_fresh.pages[0]
-
-                # Merge template and overlay
-                page.merge_page(overlay_pdf.pages[0])
-                output.add_page(page)
+        try:
+            if workers <= 1 or len(data_list) < PARALLEL_MIN_BATCH:
+                # Render straight into the output writer
+                output = PdfWriter()
+                for data in data_list:
+                    output.add_page(self.render_page(data, data.get('seller_name', '')))
+            else:
+                # Workers return one multi-page PDF per chunk; stitch them together in order
+                output = PdfWriter()
+                for chunk_pdf in self.render_batch(data_list, workers, combine=True):
+                    for page in PdfReader(io.BytesIO(chunk_pdf)).pages:
+                        output.add_page(page)
 
             # Write output
-            with open(output_path, 'wb') as output_file:
-                output.write(output_file)
+            if hasattr(output_path, 'write'):
+                output.write(output_path)
+            else:
+                with open(output_path, 'wb') as output_file:
+                    output.write(output_file)
 
             return output_path
 
@@ -243,6 +384,27 @@ class PDFFiller:
             raise Exception(f"Error creating single multi-page PDF: {str(e)}")
 
 
+# Batches smaller than this render in-process; pool start-up and pickling would outweigh the gain
+PARALLEL_MIN_BATCH = 20
+
+# Set in each rendering process by _init_render_worker()
+_worker_filler = None
+
+
+def _init_render_worker(template_specs):
+    """Load the templates once per rendering process"""
+    global _worker_filler
+    _worker_filler = PDFFiller(registry=TemplateRegistry.from_specs(template_specs))
+    _worker_filler.preload()
+
+
+def _render_chunk(chunk, combine):
+    """Render a chunk of records in a worker process"""
+    if combine:
+        return [_worker_filler.render_pdf_bytes(chunk)]
+    return [_worker_filler.render_pdf_bytes([data]) for data in chunk]
+
+
 if __name__ == "__main__":
     # Test the PDF filler
     template = "../Target.pdf"
@@ -0,0 +1,186 @@
+"""
+Pipeline Module
+The upload processing steps (hash, OCR, parse, store) shared by the web app and batch tools
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from server.dedup import content_hash, vehicle_key
+
+
+class ExtractionPipeline:
+    """Turns one uploaded report into parsed vehicle data, reusing earlier results where possible"""
+
+    def __init__(self, ocr_processor, data_parser, store=None, ocr_slots=1, verbose=False, governor=None):
+        """
+        Initialize pipeline
+
+        Args:
+            ocr_processor: OCRProcessor instance
+            data_parser: DataParser instance
+            store: ExtractionStore for duplicate lookups and persistence (None to skip both)
+            ocr_slots: Maximum number of OCR jobs running at once in this process
+            verbose: Print the raw OCR text and parsed data for every file
+            governor: MemoryGovernor each OCR job waits on for headroom (None to skip)
+        """
+        self.ocr_processor = ocr_processor
+        self.data_parser = data_parser
+        self.store = store
+        self.ocr_slots_size = ocr_slots
+        self.verbose = verbose
+        self.governor = governor
+        self.ocr_slots = threading.BoundedSemaphore(ocr_slots)
+
+    def reset_locks(self):
+        """Replace the OCR semaphore inherited from a parent process after fork"""
+        self.ocr_slots = threading.BoundedSemaphore(self.ocr_slots_size)
+
+    def lookup(self, file_path: str) -> Tuple[str, Optional[Dict]]:
+        """
+        Hash a file and find an earlier record made from the same bytes
+
+        Args:
+            file_path: Path to the uploaded file
+
+        Returns:
+            Tuple of (SHA-256 hex digest, earlier record or None)
+        """
+        file_hash = content_hash(file_path)
+        previous = self.store.find_by_content_hash(file_hash) if self.store is not None else None
+        return file_hash, previous
+
+    def recognize(self, file_path: str, filename: str = '', slot=None) -> str:
+        """
+        Run OCR on a file
+
+        Args:
+            file_path: Path to the file
+            filename: Name used in debug output
+            slot: Context manager held while OCR runs (defaults to the pipeline's semaphore)
+
+        Returns:
+            OCR text
+        """
+        # Rasterizing and OCR are the biggest allocations; wait for memory first, outside
+        # the slot so a throttled upload doesn't hold up everyone queued behind it
+        if self.governor is not None:
+            self.governor.wait_for_headroom()
+        with slot if slot is not None else self.ocr_slots:
+            ocr_text = self.ocr_processor.process_file(file_path)
+
+        if self.verbose:
+            # DEBUG: Print raw OCR text
+            print("=" * 80, flush=True)
+            print(f"OCR TEXT FOR {filename}:", flush=True)
+            print("-" * 80, flush=True)
+            print(ocr_text, flush=True)
+            print("=" * 80, flush=True)
+
+        return ocr_text
+
+    def parse(self, ocr_text: str, filename: str = '') -> Dict:
+        """
+        Parse OCR text into vehicle data
+
+        Args:
+            ocr_text: Text from recognize()
+            filename: Original filename, stored as source_filename
+
+        Returns:
+            Extracted data dictionary
+        """
+        extracted_data = self.data_parser.parse_text(ocr_text)
+
+        if self.verbose:
+            # DEBUG: Print extracted data
+            print("EXTRACTED DATA:", flush=True)
+            print(extracted_data, flush=True)
+            print("=" * 80, flush=True)
+
+        # Add source filename
+        extracted_data['source_filename'] = filename
+        return extracted_data
+
+    def record(self, extracted_data: Dict, ocr_text: str, filename: str, file_hash: str = None) -> Optional[Dict]:
+        """
+        Flag an earlier upload of the same vehicle and persist the result
+
+        Sets extracted_data['record_id'] when the store accepts the record.
+
+        Args:
+            extracted_data: Data from parse()
+            ocr_text: Full OCR text
+            filename: Original filename
+            file_hash: SHA-256 from lookup()
+
+        Returns:
+            Duplicate description ({'record_id', 'match'}) or None
+        """
+        if self.store is None:
+            return None
+
+        # Same vehicle uploaded before as a different file
+        duplicate = None
+        key = vehicle_key(extracted_data)
+        existing = self.store.find_vehicle(key) if key else None
+        if existing is not None:
+            duplicate = {'record_id': existing['record_id'], 'match': key[0]}
+
+        # Persist the full result so it can be found and regenerated later
+        try:
+            extracted_data['record_id'] = self.store.save(extracted_data, ocr_text, filename, file_hash)
+        except Exception as e:
+            print(f"Error saving extraction for {filename}: {e}", flush=True)
+
+        return duplicate
+
+    def extract(self, file_path: str, filename: str, slot=None, found=None) -> Dict:
+        """
+        Run every step for one file
+
+        Args:
+            file_path: Path to the saved file
+            filename: Original filename
+            slot: Passed to recognize(); only entered if the file needs OCR
+            found: Result of lookup() if the caller already ran it
+
+        Returns:
+            Dictionary with data, ocr_text (full), duplicate and timings
+        """
+        started = time.perf_counter()
+        file_hash, previous = found if found is not None else self.lookup(file_path)
+
+        # Byte-identical file seen before: reuse its result and skip OCR
+        if previous is not None:
+            ocr_text = self.store.get_ocr_text(previous['record_id']) or ''
+            extracted_data = {key: value for key, value in previous.items() if key not in ('record_id', 'created_at')}
+            extracted_data['source_filename'] = filename
+            # Saved as a new record, so later edits to this upload (reparse) leave the earlier one alone
+            try:
+                extracted_data['record_id'] = self.store.save(extracted_data, ocr_text, filename, file_hash)
+            except Exception as e:
+                print(f"Error saving extraction for {filename}: {e}", flush=True)
+            return {
+                'data': extracted_data,
+                'ocr_text': ocr_text,
+                'duplicate': {'record_id': previous['record_id'], 'match': 'content'},
+                'ocr_ms': 0.0,
+                'total_ms': round((time.perf_counter() - started) * 1000, 1)
+            }
+
+        ocr_started = time.perf_counter()
+        ocr_text = self.recognize(file_path, filename, slot)
+        ocr_ms = round((time.perf_counter() - ocr_started) * 1000, 1)
+
+        extracted_data = self.parse(ocr_text, filename)
+        duplicate = self.record(extracted_data, ocr_text, filename, file_hash)
+
+        return {
+            'data': extracted_data,
+            'ocr_text': ocr_text,
+            'duplicate': duplicate,
+            'ocr_ms': ocr_ms,
+            'total_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
@@ -0,0 +1,291 @@
+"""
+Records Module
+Slotted vehicle records and the compact columnar batch format used between the browser and the API
+"""
+
+import gzip
+import json
+import zlib
+from dataclasses import dataclass, field, fields
+from typing import Dict, Iterable, List
+
+# Version of the columnar batch format produced by encode_batch()
+BATCH_FORMAT = 'columnar'
+BATCH_VERSION = 1
+
+# Fields that are only useful in the browser and are never sent back for rendering
+CLIENT_ONLY_FIELDS = ('thumbnail', 'ocr_text')
+
+
+@dataclass(slots=True)
+class VehicleRecord:
+    """
+    One vehicle's declaration data
+
+    Supports the read-only mapping calls (get, [], in) that the PDF and Excel
+    writers already use on dictionaries. Keys outside the known fields are kept
+    in extra.
+    """
+    record_id: int = None
+    seller_name: str = None
+    source_filename: str = None
+    mta: str = None
+    year: str = None
+    make: str = None
+    model: str = None
+    type: str = None
+    transmission: str = None
+    color: str = None
+    engine_no: str = None
+    vin: str = None
+    reg: str = None
+    rego_expiry: str = None
+    odometer: str = None
+    vin_warning: str = None
+    created_at: float = None
+    extra: Dict = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'VehicleRecord':
+        """
+        Build a record from a data dictionary, dropping browser-only fields
+
+        Args:
+            data: Data dictionary (parser output, stored record or client row)
+
+        Returns:
+            VehicleRecord
+        """
+        record = cls()
+        for key, value in data.items():
+            if key in CLIENT_ONLY_FIELDS:
+                continue
+            if key in RECORD_FIELDS:
+                setattr(record, key, value)
+            else:
+                record.extra[key] = value
+        return record
+
+    def to_dict(self) -> Dict:
+        """Return the non-empty fields as a plain dictionary"""
+        data = {name: getattr(self, name) for name in RECORD_FIELDS if getattr(self, name) is not None}
+        data.update(self.extra)
+        return data
+
+    def get(self, key, default=None):
+        """Dictionary-style lookup; unset fields count as missing"""
+        if key in RECORD_FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        return self.extra.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+RECORD_FIELDS = frozenset(f.name for f in fields(VehicleRecord) if f.name != 'extra')
+
+
+def encode_batch(rows: Iterable, exclude=CLIENT_ONLY_FIELDS) -> Dict:
+    """
+    Encode records as columns under a single field list
+
+    Every key name appears once instead of once per record, and fields that are
+    empty in every row are left out entirely.
+
+    Args:
+        rows: Data dictionaries or VehicleRecords
+        exclude: Keys left out of the batch
+
+    Returns:
+        Dictionary with format, version, count, fields and columns
+    """
+    dicts = [row.to_dict() if isinstance(row, VehicleRecord) else row for row in rows]
+
+    names = []
+    seen = set()
+    for data in dicts:
+        for key, value in data.items():
+            if key not in seen and key not in exclude and value not in (None, ''):
+                seen.add(key)
+                names.append(key)
+
+    return {
+        'format': BATCH_FORMAT,
+        'version': BATCH_VERSION,
+        'count': len(dicts),
+        'fields': names,
+        'columns': [[data.get(name) for data in dicts] for name in names]
+    }
+
+
+def decode_batch(batch: Dict, max_rows: int = None) -> List[Dict]:
+    """
+    Turn a columnar batch back into one dictionary per record
+
+    The number of rows comes from the columns themselves; 'count' must agree
+    with them, so a short body cannot ask for millions of empty rows.
+
+    Args:
+        batch: Dictionary produced by encode_batch() (or app.js encodeBatch())
+        max_rows: Most rows accepted (None for no limit)
+
+    Returns:
+        List of data dictionaries, without null values
+
+    Raises:
+        ValueError: If the batch is malformed, too large or an unsupported version
+    """
+    if not isinstance(batch, dict):
+        raise ValueError('Batch must be an object')
+    if batch.get('format') != BATCH_FORMAT or batch.get('version') != BATCH_VERSION:
+        raise ValueError(f"Unsupported batch format: {batch.get('format')} v{batch.get('version')}")
+
+    names = batch.get('fields', [])
+    columns = batch.get('columns', [])
+    if (not isinstance(names, list) or not isinstance(columns, list)
+            or not all(isinstance(name, str) for name in names)
+            or not all(isinstance(column, list) for column in columns)):
+        raise ValueError("Batch 'fields' must be a list of names and 'columns' a list of lists")
+    if len(names) != len(columns):
+        raise ValueError('Batch columns do not match its field list')
+    lengths = {len(column) for column in columns}
+    if len(lengths) > 1:
+        raise ValueError('Batch columns differ in length')
+    count = lengths.pop() if lengths else 0
+    if batch.get('count', count) != count:
+        raise ValueError(f"Batch count {batch.get('count')!r} does not match its {count} row(s)")
+    if max_rows is not None and count > max_rows:
+        raise ValueError(f'Batch has {count} records; at most {max_rows} are accepted per request')
+
+    rows = [{} for _ in range(count)]
+    for name, column in zip(names, columns):
+        for row, value in zip(rows, column):
+            if value is not None:
+                row[name] = value
+    return rows
+
+
+def decompress_brotli(raw: bytes, max_bytes: int) -> bytes:
+    """
+    Decompress a brotli body, stopping once it passes max_bytes
+
+    A few hundred bytes of brotli can expand to hundreds of megabytes, so the
+    output is produced in pieces capped at the remaining allowance instead
+    of all at once.
+
+    Args:
+        raw: Compressed bytes
+        max_bytes: Largest decompressed size accepted
+
+    Returns:
+        Decompressed bytes (longer than max_bytes if the body is too large)
+
+    Raises:
+        ValueError: If brotli (1.2 or later) is missing or the body is not valid brotli
+    """
+    try:
+        import brotli
+    except ImportError:
+        raise ValueError('Brotli request bodies need the brotli package')
+
+    decompressor = brotli.Decompressor()
+    output = bytearray()
+    data = raw
+    try:
+        while len(output) <= max_bytes:
+            output += decompressor.process(data, output_buffer_limit=max_bytes + 1 - len(output))
+            data = b''
+            # Finished, or all input consumed without more output pending
+            if decompressor.is_finished() or decompressor.can_accept_more_data():
+                break
+    except TypeError:
+        raise ValueError('Brotli request bodies need brotli 1.2 or later')
+    except brotli.error as e:
+        raise ValueError(f'Invalid compressed body: {e}')
+
+    if len(output) <= max_bytes and not decompressor.is_finished():
+        raise ValueError('Invalid compressed body: truncated brotli stream')
+    return bytes(output)
+
+
+def decode_body(raw: bytes, content_encoding: str = None, max_bytes: int = 64 * 1024 * 1024):
+    """
+    Parse a JSON request body, decompressing gzip/deflate/br first
+
+    Args:
+        raw: Request body bytes
+        content_encoding: Value of the Content-Encoding header
+        max_bytes: Largest decompressed size accepted
+
+    Returns:
+        Parsed JSON value, or None for an empty body
+
+    Raises:
+        ValueError: If the encoding is unsupported, the body is too large or not valid JSON
+    """
+    encoding = (content_encoding or '').strip().lower()
+    if encoding in ('gzip', 'x-gzip', 'deflate'):
+        # wbits=47 auto-detects gzip and zlib headers; some clients send 'deflate'
+        # as a raw stream without the zlib header (wbits=-15)
+        try:
+            raw = zlib.decompressobj(47).decompress(raw, max_bytes + 1)
+        except zlib.error as e:
+            if encoding != 'deflate':
+                raise ValueError(f'Invalid compressed body: {e}')
+            try:
+                raw = zlib.decompressobj(-15).decompress(raw, max_bytes + 1)
+            except zlib.error:
+                raise ValueError(f'Invalid compressed body: {e}')
+    elif encoding == 'br':
+        raw = decompress_brotli(raw, max_bytes)
+    elif encoding not in ('', 'identity'):
+        raise ValueError(f'Unsupported Content-Encoding: {content_encoding}')
+
+    if len(raw) > max_bytes:
+        raise ValueError('Request body too large')
+    if not raw:
+        return None
+    return json.loads(raw)
+
+
+def compress_json(payload: bytes, level: int = 6) -> bytes:
+    """Gzip an encoded JSON response body"""
+    return gzip.compress(payload, compresslevel=level)
+
+
+if __name__ == "__main__":
+    # Compare list-of-dicts with the columnar format for a large batch
+    import time
+
+    sample = {
+        'seller_name': 'Pickles Auctions', 'source_filename': 'report_0001.pdf', 'mta': '220902',
+        'year': '2014', 'make': 'MAZDA', 'model': 'CX-5 MAXX SPORT', 'type': 'Wagon',
+        'transmission': 'Automatic', 'color': 'Red', 'engine_no': 'PE20360606',
+        'vin': 'JM0KE10F200405930', 'reg': 'ABC123', 'rego_expiry': '12/2025', 'odometer': '186521',
+        'ocr_text': 'x' * 500, 'thumbnail': 'data:image/jpeg;base64,' + 'A' * 40000
+    }
+    rows = [{**sample, 'mta': str(220902 + i), 'record_id': i} for i in range(1000)]
+
+    for label, build in (
+        ('dicts (as sent today)', lambda: json.dumps({'data': rows}).encode()),
+        ('dicts, no client fields', lambda: json.dumps({'data': [
+            {k: v for k, v in row.items() if k not in CLIENT_ONLY_FIELDS} for row in rows]}).encode()),
+        ('columnar', lambda: json.dumps({'batch': encode_batch(rows)}).encode()),
+        ('columnar + gzip', lambda: compress_json(json.dumps({'batch': encode_batch(rows)}).encode()))
+    ):
+        started = time.perf_counter()
+        body = build()
+        encode_ms = (time.perf_counter() - started) * 1000
+        print(f"{label:24s} {len(body) / 1024:10.1f} KB  encode {encode_ms:7.1f} ms")
+
+    body = compress_json(json.dumps({'batch': encode_batch(rows)}).encode())
+    started = time.perf_counter()
+    records = [VehicleRecord.from_dict(row) for row in decode_batch(decode_body(body, 'gzip')['batch'])]
+    print(f"decode gzip columnar -> {len(records)} records in {(time.perf_counter() - started) * 1000:.1f} ms")
@@ -0,0 +1,243 @@
+"""
+Scheduler Module
+Admission control and per-client round-robin scheduling for OCR jobs
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# Lanes: small requests (a few files from someone at the screen) go ahead of bulk uploads
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+
+class SchedulerFull(Exception):
+    """Raised when a request would push a queue past its limit"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """
+    A client's admitted request: up to `jobs` OCR slots, taken one at a time
+
+    Always close() the ticket (or use it as a context manager) so unused
+    reservations are returned.
+    """
+
+    def __init__(self, scheduler, client, jobs, lane):
+        self.scheduler = scheduler
+        self.client = client
+        self.lane = lane
+        self.remaining = jobs
+        # Grant times of the slots this ticket holds, for job duration estimates
+        self.granted = deque()
+
+    @contextmanager
+    def slot(self):
+        """Block until this client's turn, then hold one slot for the with-block"""
+        event = threading.Event()
+        self.scheduler._enqueue(self, event.set)
+        event.wait()
+        try:
+            yield
+        finally:
+            self.scheduler._finish(self)
+
+    async def acquire_async(self):
+        """Wait on the event loop for a slot; call release() when the job is done"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def settle():
+            # The request may have gone away while queued: hand the slot straight back
+            if future.cancelled():
+                self.release()
+            else:
+                future.set_result(None)
+
+        self.scheduler._enqueue(self, lambda: loop.call_soon_threadsafe(settle))
+        await future
+
+    def release(self):
+        """Return a slot taken with acquire_async()"""
+        self.scheduler._finish(self)
+
+    def close(self):
+        """Give back reservations for jobs that never needed a slot (e.g. reused results)"""
+        self.scheduler._cancel(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FairScheduler:
+    """
+    Global concurrency limit with per-client queues
+
+    Clients take turns within a lane, so one client's 50-file upload gets
+    one slot in turn with everyone else instead of all of them. Interactive
+    requests go first, but every bulk_every-th grant goes to a waiting bulk
+    job so bulk work is never starved.
+    """
+
+    def __init__(self, concurrency=1, max_client_jobs=20, max_total_jobs=100, small_job_files=3,
+                 bulk_every=4, initial_job_seconds=5.0):
+        """
+        Initialize scheduler
+
+        Args:
+            concurrency: Jobs running at once in this process
+            max_client_jobs: Outstanding jobs one client may have before new requests get 429
+            max_total_jobs: Outstanding jobs across all clients before new requests get 429
+            small_job_files: Requests with at most this many files use the interactive lane
+            bulk_every: Grant a waiting bulk job after this many interactive grants in a row
+            initial_job_seconds: Job duration assumed for Retry-After before any job has run
+        """
+        self.concurrency = max(1, concurrency)
+        self.max_client_jobs = max_client_jobs
+        self.max_total_jobs = max_total_jobs
+        self.small_job_files = small_job_files
+        self.bulk_every = max(1, bulk_every)
+
+        self._lock = threading.Lock()
+        self._running = 0
+        # lane -> client -> deque of (ticket, grant) waiters; clients rotate to the back after each grant
+        self._queues = {INTERACTIVE: OrderedDict(), BULK: OrderedDict()}
+        self._outstanding = {}
+        self._total_outstanding = 0
+        self._interactive_streak = 0
+        self._job_seconds = initial_job_seconds
+        self.rejected = 0
+
+    def reset_locks(self):
+        """Replace the lock inherited from a parent process after fork"""
+        self._lock = threading.Lock()
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained, at least 1"""
+        backlog = self._total_outstanding / self.concurrency
+        return max(1, math.ceil(backlog * self._job_seconds))
+
+    def admit(self, client, jobs):
+        """
+        Admit a request with `jobs` OCR jobs or refuse it
+
+        The global cap applies to every request. Each cap only counts work
+        already outstanding, so one request larger than a cap is not refused
+        outright: a client with nothing outstanding skips the per-client cap,
+        and any request is admitted while nothing at all is outstanding.
+
+        Args:
+            client: Client identifier
+            jobs: Number of files needing OCR
+
+        Returns:
+            Ticket
+
+        Raises:
+            SchedulerFull: If the client's or the global queue is full
+        """
+        lane = INTERACTIVE if jobs <= self.small_job_files else BULK
+        with self._lock:
+            client_outstanding = self._outstanding.get(client, 0)
+            if client_outstanding and client_outstanding + jobs > self.max_client_jobs:
+                self.rejected += 1
+                raise SchedulerFull('Too many files queued for this client', self.retry_after())
+            if self._total_outstanding and self._total_outstanding + jobs > self.max_total_jobs:
+                self.rejected += 1
+                raise SchedulerFull('Server is busy', self.retry_after())
+
+            self._outstanding[client] = client_outstanding + jobs
+            self._total_outstanding += jobs
+        return Ticket(self, client, jobs, lane)
+
+    def _enqueue(self, ticket, grant):
+        with self._lock:
+            queue = self._queues[ticket.lane].setdefault(ticket.client, deque())
+            queue.append((ticket, grant))
+            self._dispatch()
+
+    def _next_waiter(self):
+        """Pick the next job: interactive first, with a bulk job every bulk_every grants"""
+        interactive, bulk = self._queues[INTERACTIVE], self._queues[BULK]
+        if interactive and not (bulk and self._interactive_streak >= self.bulk_every):
+            lane = interactive
+            self._interactive_streak += 1
+        elif bulk:
+            lane = bulk
+            self._interactive_streak = 0
+        else:
+            return None
+
+        # Round-robin: take the first client's oldest job and move the client to the back
+        client, waiters = next(iter(lane.items()))
+        waiter = waiters.popleft()
+        del lane[client]
+        if waiters:
+            lane[client] = waiters
+        return waiter
+
+    def _dispatch(self):
+        """Grant slots while any are free (called with the lock held)"""
+        while self._running < self.concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            ticket, grant = waiter
+            self._running += 1
+            ticket.granted.append(time.monotonic())
+            grant()
+
+    def _finish(self, ticket):
+        with self._lock:
+            if ticket.granted:
+                # Moving average of job time, for Retry-After estimates
+                elapsed = time.monotonic() - ticket.granted.popleft()
+                self._job_seconds = 0.8 * self._job_seconds + 0.2 * elapsed
+            self._running -= 1
+            self._release(ticket, 1)
+            self._dispatch()
+
+    def _cancel(self, ticket):
+        with self._lock:
+            self._release(ticket, ticket.remaining)
+
+    def _release(self, ticket, jobs):
+        """Return reservations (called with the lock held)"""
+        jobs = min(jobs, ticket.remaining)
+        ticket.remaining -= jobs
+        self._total_outstanding -= jobs
+        left = self._outstanding.get(ticket.client, 0) - jobs
+        if left > 0:
+            self._outstanding[ticket.client] = left
+        else:
+            self._outstanding.pop(ticket.client, None)
+
+    def stats(self):
+        """
+        Return queue sizes for the health endpoint
+
+        Returns:
+            Dictionary of running, queued and outstanding job counts
+        """
+        with self._lock:
+            return {
+                'concurrency': self.concurrency,
+                'running': self._running,
+                'queued': {lane: sum(len(waiters) for waiters in clients.values())
+                           for lane, clients in self._queues.items()},
+                'outstanding': self._total_outstanding,
+                'clients': len(self._outstanding),
+                'rejected': self.rejected,
+                'job_seconds': round(self._job_seconds, 2)
+            }
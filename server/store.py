@@ -0,0 +1,261 @@
+"""
+Extraction Store Module
+Persists parsed results in SQLite with indexed lookup by VIN, MTA and registration
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from server.dedup import normalize_vin, normalize_mta
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    source_filename TEXT,
+    vin TEXT,
+    mta TEXT,
+    reg TEXT,
+    data TEXT NOT NULL,
+    ocr_text TEXT,
+    content_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_records_vin ON records (vin);
+CREATE INDEX IF NOT EXISTS idx_records_mta ON records (mta);
+CREATE INDEX IF NOT EXISTS idx_records_reg ON records (reg);
+CREATE INDEX IF NOT EXISTS idx_records_created_at ON records (created_at);
+"""
+
+# Columns added after the first release, applied to existing databases on open
+MIGRATIONS = {
+    'content_hash': 'ALTER TABLE records ADD COLUMN content_hash TEXT'
+}
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_records_content_hash ON records (content_hash);
+"""
+
+
+def normalize_key(value) -> str:
+    """Normalize an identifier for indexing (uppercase, no spaces or dashes)"""
+    if not value:
+        return ''
+    return str(value).upper().replace(' ', '').replace('-', '')
+
+
+class ExtractionStore:
+    """Stores every parsed upload so declarations can be regenerated without OCR"""
+
+    def __init__(self, db_path):
+        """
+        Initialize extraction store
+
+        Args:
+            db_path: Path to the SQLite database file (created if missing)
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._migrate()
+
+    def _migrate(self):
+        """Create the schema and add any columns missing from an older database"""
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(records)')}
+        for column, statement in MIGRATIONS.items():
+            if column not in columns:
+                conn.execute(statement)
+        conn.executescript(INDEXES)
+
+    def _connect(self):
+        """
+        Return this thread's connection, opening one if needed
+
+        Connections are never shared across threads or across a fork.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # WAL lets several gunicorn workers read while one writes
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _row_to_record(self, row) -> Dict:
+        """Convert a database row into the data dictionary returned to clients"""
+        record = json.loads(row['data'])
+        record['record_id'] = row['id']
+        record['created_at'] = row['created_at']
+        return record
+
+    def save(self, data: Dict, ocr_text: str = '', source_filename: str = '', file_hash: str = None) -> int:
+        """
+        Store a parsed result
+
+        Args:
+            data: Extracted data dictionary
+            ocr_text: Full OCR text the data was parsed from
+            source_filename: Original upload filename
+            file_hash: SHA-256 of the uploaded file, for exact-duplicate lookups
+
+        Returns:
+            New record id
+        """
+        stored = {key: value for key, value in data.items() if key not in ('thumbnail', 'record_id')}
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                'INSERT INTO records (created_at, source_filename, vin, mta, reg, data, ocr_text, content_hash) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (time.time(), source_filename, normalize_vin(data.get('vin')),
+                 normalize_mta(data.get('mta')), normalize_key(data.get('reg')),
+                 json.dumps(stored), ocr_text, file_hash)
+            )
+        return cursor.lastrowid
+
+    def update(self, record_id: int, data: Dict) -> bool:
+        """
+        Replace a record's data (e.g. after user edits), keeping its OCR text and content hash
+
+        Args:
+            record_id: Record id
+            data: New data dictionary
+
+        Returns:
+            True if the record existed
+        """
+        stored = {key: value for key, value in data.items()
+                  if key not in ('thumbnail', 'record_id', 'created_at')}
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                'UPDATE records SET vin = ?, mta = ?, reg = ?, data = ? WHERE id = ?',
+                (normalize_vin(data.get('vin')), normalize_mta(data.get('mta')),
+                 normalize_key(data.get('reg')), json.dumps(stored), record_id)
+            )
+        return cursor.rowcount > 0
+
+    def get(self, record_id: int) -> Optional[Dict]:
+        """
+        Fetch a single record
+
+        Args:
+            record_id: Record id
+
+        Returns:
+            Data dictionary, or None if not found
+        """
+        row = self._connect().execute('SELECT * FROM records WHERE id = ?', (record_id,)).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def get_many(self, record_ids: List[int]) -> List[Optional[Dict]]:
+        """
+        Fetch several records, in the order requested
+
+        Args:
+            record_ids: List of record ids (integers or numeric strings)
+
+        Returns:
+            List of data dictionaries (None for ids that don't exist)
+        """
+        if not record_ids:
+            return []
+
+        placeholders = ','.join('?' * len(record_ids))
+        rows = self._connect().execute(
+            f'SELECT * FROM records WHERE id IN ({placeholders})', list(record_ids)
+        ).fetchall()
+        # Keyed by text so ids sent as JSON strings ("12") match too
+        by_id = {str(row['id']): self._row_to_record(row) for row in rows}
+        return [by_id.get(str(record_id)) for record_id in record_ids]
+
+    def get_ocr_text(self, record_id: int) -> Optional[str]:
+        """
+        Fetch the full OCR text stored with a record
+
+        Args:
+            record_id: Record id
+
+        Returns:
+            OCR text, or None if not found
+        """
+        row = self._connect().execute('SELECT ocr_text FROM records WHERE id = ?', (record_id,)).fetchone()
+        return row['ocr_text'] if row else None
+
+    def find_by_content_hash(self, file_hash: str) -> Optional[Dict]:
+        """
+        Return the oldest record created from a byte-identical file
+
+        Args:
+            file_hash: SHA-256 of the uploaded file
+
+        Returns:
+            Data dictionary, or None if this file has not been seen
+        """
+        row = self._connect().execute(
+            'SELECT * FROM records WHERE content_hash = ? ORDER BY id LIMIT 1', (file_hash,)
+        ).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def find_vehicle(self, key) -> Optional[Dict]:
+        """
+        Return the oldest record for a vehicle key from dedup.vehicle_key()
+
+        Args:
+            key: ('vin', value) or ('mta', value)
+
+        Returns:
+            Data dictionary, or None if the vehicle has not been seen
+        """
+        column, value = key
+        if column not in ('vin', 'mta'):
+            return None
+        row = self._connect().execute(
+            f'SELECT * FROM records WHERE {column} = ? ORDER BY id LIMIT 1', (value,)
+        ).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def find(self, vin=None, mta=None, reg=None, since=None, until=None, limit=100) -> List[Dict]:
+        """
+        Search records using the indexed columns, newest first
+
+        Args:
+            vin: VIN to match exactly (normalized)
+            mta: MTA/stock number to match exactly (normalized)
+            reg: Registration to match exactly (normalized)
+            since: Only records created at or after this Unix time
+            until: Only records created before this Unix time
+            limit: Maximum number of records to return
+
+        Returns:
+            List of data dictionaries
+        """
+        clauses = []
+        params = []
+        for column, value in (('vin', normalize_vin(vin)), ('mta', normalize_mta(mta)), ('reg', normalize_key(reg))):
+            if value:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        if since is not None:
+            clauses.append('created_at >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('created_at < ?')
+            params.append(until)
+
+        query = 'SELECT * FROM records'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY created_at DESC LIMIT ?'
+        params.append(limit)
+
+        return [self._row_to_record(row) for row in self._connect().execute(query, params)]
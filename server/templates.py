@@ -0,0 +1,293 @@
+"""
+Templates Module
+Declaration templates with compiled field layouts, loaded once and selected per record
+"""
+
+import io
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# Name of the built-in Target.pdf template
+DEFAULT_TEMPLATE = 'default'
+
+# Where each field is drawn on Target.pdf, in PDF points from the bottom-left corner.
+# Layout of the form:
+# Row 1: Year | Make | Model | Type | Auto/Man | Colour
+# Row 2: Eng Number (boxes) | | | | | Rego Number | | Check Digit
+# Row 3: VIN Number (boxes) | | | | | Rego Expires | KMS |
+# Row 4: Stock Number | | | | | | Price | $
+TARGET_LAYOUT = {
+    'font': 'Helvetica',
+    'font_size': 10,
+    # Seller name (after "We") - all caps, 4px bigger font
+    'seller': {'x': 65, 'y': 745, 'font_size': 14, 'transform': 'upper'},
+    'fields': [
+        # Row 1: basic vehicle data (make, transmission and colour as "Title" case)
+        {'key': 'year', 'x': 32, 'y': 660},
+        {'key': 'make', 'x': 78, 'y': 660, 'transform': 'capitalize'},
+        {'key': 'model', 'x': 172, 'y': 660, 'max_chars': 15},
+        {'key': 'type', 'x': 260, 'y': 660},
+        {'key': 'transmission', 'x': 317, 'y': 660, 'transform': 'capitalize'},
+        {'key': ['colour', 'color'], 'x': 373, 'y': 660, 'transform': 'capitalize'},
+        # Row 2: engine number in character boxes, rego number 2px larger and 2px up
+        {'key': 'engine_no', 'x': 94, 'y': 640, 'box_width': 18.7, 'max_chars': 12},
+        {'key': 'reg', 'x': 438, 'y': 642, 'font_size': 12},
+        # Row 3: VIN in character boxes, rego expiry and KMS moved up
+        {'key': 'vin', 'x': 112, 'y': 613, 'box_width': 18.7, 'max_chars': 17},
+        {'key': 'rego_expiry', 'x': 467, 'y': 616},
+        {'key': 'odometer', 'x': 537, 'y': 616},
+        # Row 4: stock number, 2px larger
+        {'key': 'mta', 'x': 32, 'y': 572, 'font_size': 12}
+    ]
+}
+
+TRANSFORMS = {
+    None: str,
+    'upper': lambda value: str(value).upper(),
+    'capitalize': lambda value: str(value).capitalize()
+}
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledField:
+    """One field of a layout, resolved to drawing parameters"""
+    keys: Tuple[str, ...]
+    x: float
+    y: float
+    font_size: float
+    transform: object
+    max_chars: Optional[int]
+    box_width: Optional[float]
+
+    def value(self, data) -> str:
+        """Return the text to draw for a record, or '' if it has none"""
+        for key in self.keys:
+            value = data.get(key)
+            if value:
+                text = self.transform(value)
+                return text[:self.max_chars] if self.max_chars else text
+        return ''
+
+
+def compile_field(spec: Dict, default_font_size: float) -> CompiledField:
+    """
+    Validate one field spec and resolve its defaults
+
+    Args:
+        spec: Field dictionary from a layout
+        default_font_size: Layout font size used when the field has none
+
+    Returns:
+        CompiledField
+
+    Raises:
+        ValueError: If the spec is incomplete or uses an unknown transform
+    """
+    if 'x' not in spec or 'y' not in spec:
+        raise ValueError(f"Layout field needs x and y: {spec}")
+    if spec.get('transform') not in TRANSFORMS:
+        raise ValueError(f"Unknown transform in layout field: {spec.get('transform')}")
+
+    keys = spec.get('key', ())
+    return CompiledField(
+        keys=(keys,) if isinstance(keys, str) else tuple(keys),
+        x=float(spec['x']),
+        y=float(spec['y']),
+        font_size=float(spec.get('font_size', default_font_size)),
+        transform=TRANSFORMS[spec.get('transform')],
+        max_chars=spec.get('max_chars'),
+        box_width=spec.get('box_width')
+    )
+
+
+class DeclarationTemplate:
+    """A template PDF and its compiled layout, with the page parsed once"""
+
+    def __init__(self, name: str, pdf_path: str, layout: Dict = None, label: str = ''):
+        """
+        Initialize template
+
+        Args:
+            name: Registry name, used by records and requests to select it
+            pdf_path: Path to the blank template PDF
+            layout: Layout dictionary (defaults to TARGET_LAYOUT)
+            label: Human-readable description
+        """
+        self.name = name
+        self.pdf_path = pdf_path
+        self.layout = layout or TARGET_LAYOUT
+        self.label = label
+        self.pdf_bytes = None
+        self.page_size = None
+
+        self.font = self.layout.get('font', 'Helvetica')
+        self.font_size = float(self.layout.get('font_size', 10))
+        seller = self.layout.get('seller')
+        self.seller = compile_field(seller, self.font_size) if seller else None
+        self.fields = [compile_field(spec, self.font_size) for spec in self.layout.get('fields', [])]
+
+    def preload(self):
+        """Read the template PDF and its page size (once)"""
+        from PyPDF2 import PdfReader
+
+        if self.pdf_bytes is None:
+            with open(self.pdf_path, 'rb') as f:
+                self.pdf_bytes = f.read()
+            page = PdfReader(io.BytesIO(self.pdf_bytes)).pages[0]
+            self.page_size = (float(page.mediabox.width), float(page.mediabox.height))
+
+    def page(self):
+        """
+        Return a fresh, mergeable copy of the template's first page
+
+        Returns:
+            PyPDF2 page object
+        """
+        from PyPDF2 import PdfReader
+
+        self.preload()
+        return PdfReader(io.BytesIO(self.pdf_bytes)).pages[0]
+
+    def draw(self, can, data, seller: str = ''):
+        """
+        Draw a record onto a ReportLab canvas
+
+        Args:
+            can: ReportLab canvas sized to page_size
+            data: Data dictionary or VehicleRecord
+            seller: Seller name
+        """
+        can.setFont(self.font, self.font_size)
+        current_size = self.font_size
+
+        drawn = [(self.seller, self.seller.transform(seller))] if self.seller and seller else []
+        drawn.extend((field, field.value(data)) for field in self.fields)
+
+        for field, text in drawn:
+            if not text:
+                continue
+            if field.font_size != current_size:
+                can.setFont(self.font, field.font_size)
+                current_size = field.font_size
+            if field.box_width:
+                # One character per printed box
+                for i, char in enumerate(text):
+                    can.drawString(field.x + i * field.box_width, field.y, char)
+            else:
+                can.drawString(field.x, field.y, text)
+
+    def spec(self) -> Tuple:
+        """Return the arguments needed to rebuild this template in another process"""
+        return (self.name, self.pdf_path, self.layout, self.label)
+
+
+class TemplateRegistry:
+    """Named declaration templates, preloaded together so one process can serve all of them"""
+
+    def __init__(self, default_name: str = DEFAULT_TEMPLATE):
+        """
+        Initialize registry
+
+        Args:
+            default_name: Template used for records that don't name one
+        """
+        self.default_name = default_name
+        self.templates = {}
+
+    def register(self, name: str, pdf_path: str, layout: Dict = None, label: str = '') -> DeclarationTemplate:
+        """
+        Add (or replace) a template
+
+        Args:
+            name: Registry name
+            pdf_path: Path to the blank template PDF
+            layout: Layout dictionary (defaults to TARGET_LAYOUT)
+            label: Human-readable description
+
+        Returns:
+            The registered template
+        """
+        template = DeclarationTemplate(name, pdf_path, layout, label)
+        self.templates[name] = template
+        return template
+
+    def load_folder(self, folder: str) -> List[str]:
+        """
+        Register every template manifest (*.json) in a folder
+
+        A manifest looks like {"name": "nsw", "pdf": "nsw.pdf", "label": "...",
+        "layout": {...}}; the PDF path is relative to the folder and the layout
+        defaults to the Target.pdf layout.
+
+        A manifest that can't be read (bad JSON, no "pdf", invalid layout) is
+        logged and skipped, so one broken file never stops the server starting.
+
+        Args:
+            folder: Folder to scan (missing folders are ignored)
+
+        Returns:
+            Names of the templates loaded
+        """
+        if not os.path.isdir(folder):
+            return []
+
+        loaded = []
+        for filename in sorted(os.listdir(folder)):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(folder, filename)) as f:
+                    manifest = json.load(f)
+                name = manifest.get('name') or os.path.splitext(filename)[0]
+                self.register(name, os.path.join(folder, manifest['pdf']), manifest.get('layout'),
+                              manifest.get('label', ''))
+            except Exception as e:
+                print(f"Skipping template manifest {filename}: {e!r}", flush=True)
+                continue
+            loaded.append(name)
+        return loaded
+
+    def get(self, name: str = None) -> DeclarationTemplate:
+        """
+        Look up a template by name
+
+        Args:
+            name: Template name (None for the default)
+
+        Returns:
+            DeclarationTemplate
+
+        Raises:
+            ValueError: If no template has that name
+        """
+        template = self.templates.get(name or self.default_name)
+        if template is None:
+            raise ValueError(f"Unknown template: {name}")
+        return template
+
+    def preload(self):
+        """Read every template PDF"""
+        for template in self.templates.values():
+            template.preload()
+
+    def describe(self) -> List[Dict]:
+        """List the templates for the API"""
+        return [
+            {'name': name, 'label': template.label, 'default': name == self.default_name}
+            for name, template in self.templates.items()
+        ]
+
+    def specs(self) -> Tuple:
+        """Return what from_specs() needs to rebuild this registry in a worker process"""
+        return (self.default_name, [template.spec() for template in self.templates.values()])
+
+    @classmethod
+    def from_specs(cls, specs: Tuple) -> 'TemplateRegistry':
+        """Rebuild a registry from specs()"""
+        default_name, templates = specs
+        registry = cls(default_name)
+        for name, pdf_path, layout, label in templates:
+            registry.register(name, pdf_path, layout, label)
+        return registry
@@ -0,0 +1,376 @@
+"""
+Watch Folder Module
+Picks up reports dropped into a shared folder and runs them through the upload pipeline in micro-batches
+
+Usage: python -m server.watcher INBOX_DIR [--output DIR] [--workers N] [--batch-size N]
+"""
+
+import argparse
+import json
+import os
+import queue
+import shutil
+import signal
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from server.cli import REPORT_EXTENSIONS
+
+# Sub-folders of the inbox that finished files are moved into
+PROCESSED_DIR = 'processed'
+FAILED_DIR = 'failed'
+
+
+class FolderWatcher:
+    """Debounces new files in an inbox, groups them into micro-batches and processes them on a bounded pool"""
+
+    def __init__(self, inbox, pipeline, output_dir=None, workers=2, batch_size=10, batch_wait=5.0,
+                 settle_seconds=2.0, poll_interval=1.0, max_queued_batches=None, use_watchdog=True):
+        """
+        Initialize folder watcher
+
+        Args:
+            inbox: Folder the scanners write into
+            pipeline: ExtractionPipeline used for every file (its store keeps the results)
+            output_dir: Folder for one JSON summary per batch (defaults to INBOX/processed)
+            workers: Number of batches processed at once
+            batch_size: Largest number of files in a batch
+            batch_wait: Seconds the first file of a batch may wait for more to arrive
+            settle_seconds: Seconds a file's size and mtime must stay unchanged before it is read
+            poll_interval: Seconds between directory scans (and between checks with watchdog)
+            max_queued_batches: Batches waiting for a worker before the watcher stops accepting
+                files (defaults to twice the worker count)
+            use_watchdog: Use filesystem notifications when the watchdog package is installed
+        """
+        self.inbox = os.path.abspath(inbox)
+        self.pipeline = pipeline
+        self.output_dir = output_dir or os.path.join(self.inbox, PROCESSED_DIR)
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.use_watchdog = use_watchdog
+
+        # Backpressure: put() blocks once this many batches are waiting
+        self.batches = queue.Queue(maxsize=max_queued_batches or self.workers * 2)
+
+        # path -> (size, mtime_ns, time the file was last seen changing)
+        self._candidates = {}
+        # Paths handed to a batch and not yet moved out of the inbox
+        self._claimed = set()
+        self._claimed_lock = threading.Lock()
+        self._dirty = set()
+        self._dirty_lock = threading.Lock()
+        self._pending = []
+        self._pending_since = None
+        self._stop = threading.Event()
+        self._threads = []
+        self._observer = None
+
+        self.stats = {'batches': 0, 'succeeded': 0, 'failed': 0}
+        self._stats_lock = threading.Lock()
+
+        for folder in (os.path.join(self.inbox, PROCESSED_DIR), os.path.join(self.inbox, FAILED_DIR),
+                       self.output_dir):
+            os.makedirs(folder, exist_ok=True)
+
+    def _is_report(self, path):
+        """True for report files directly inside the inbox"""
+        name = os.path.basename(path)
+        return (os.path.dirname(os.path.abspath(path)) == self.inbox and not name.startswith('.')
+                and name.lower().endswith(REPORT_EXTENSIONS))
+
+    def _start_observer(self):
+        """
+        Subscribe to filesystem events through watchdog, if it is installed
+
+        Events only mark paths for a stat check; the polling scan stays the
+        source of truth, so missed events are caught on the next scan.
+
+        Returns:
+            True if notifications are active
+        """
+        if not self.use_watchdog:
+            return False
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return False
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if not event.is_directory:
+                    with watcher._dirty_lock:
+                        watcher._dirty.add(getattr(event, 'dest_path', None) or event.src_path)
+
+        self._observer = Observer()
+        self._observer.schedule(Handler(), self.inbox, recursive=False)
+        self._observer.start()
+        return True
+
+    def scan(self, full=True):
+        """
+        Update the candidate list from the inbox
+
+        Args:
+            full: List the whole inbox (polling); otherwise only stat paths reported by watchdog
+        """
+        if full:
+            try:
+                paths = [os.path.join(self.inbox, name) for name in os.listdir(self.inbox)]
+            except OSError as e:
+                print(f"Cannot list {self.inbox}: {e}", flush=True)
+                return
+        else:
+            with self._dirty_lock:
+                paths, self._dirty = list(self._dirty), set()
+            # Candidates still settling need re-checking even without new events
+            paths.extend(self._candidates)
+
+        now = time.time()
+        with self._claimed_lock:
+            claimed = set(self._claimed)
+
+        for path in set(paths):
+            if path in claimed or not self._is_report(path):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Deleted or renamed before we got to it
+                self._candidates.pop(path, None)
+                continue
+
+            signature = (stat.st_size, stat.st_mtime_ns)
+            previous = self._candidates.get(path)
+            if previous is None or previous[:2] != signature:
+                self._candidates[path] = (*signature, now)
+
+    def stable_files(self, now=None):
+        """
+        Return candidates that have stopped changing, removing them from the candidate list
+
+        Args:
+            now: Current time (defaults to time.time())
+
+        Returns:
+            List of paths, oldest change first
+        """
+        now = now or time.time()
+        ready = [(changed_at, path) for path, (size, _, changed_at) in self._candidates.items()
+                 if size > 0 and now - changed_at >= self.settle_seconds]
+        for _, path in ready:
+            del self._candidates[path]
+        return [path for _, path in sorted(ready)]
+
+    def _flush(self, force=False):
+        """
+        Queue the pending batch when it is full, has waited batch_wait seconds, or force is set
+
+        Returns:
+            True if a batch was queued; False if nothing was due or stop() interrupted the wait
+        """
+        if not self._pending:
+            return False
+        waited = time.time() - self._pending_since
+        if not force and len(self._pending) < self.batch_size and waited < self.batch_wait:
+            return False
+
+        batch, self._pending, self._pending_since = self._pending[:self.batch_size], self._pending[self.batch_size:], None
+        if self._pending:
+            self._pending_since = time.time()
+
+        # Blocks while every worker is busy and the queue is full
+        while not self._stop.is_set():
+            try:
+                self.batches.put(batch, timeout=self.poll_interval)
+                return True
+            except queue.Full:
+                continue
+
+        # Stopping: keep the batch so shutdown can still queue it
+        self._pending = batch + self._pending
+        self._pending_since = self._pending_since or time.time()
+        return False
+
+    def _process_batch(self, batch):
+        """Run each file of a batch through the pipeline, move it out of the inbox and write a summary"""
+        batch_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        started = time.perf_counter()
+        results = []
+
+        for path in batch:
+            filename = os.path.basename(path)
+            try:
+                extraction = self.pipeline.extract(path, filename)
+                data = extraction['data']
+                results.append({
+                    'filename': filename,
+                    'status': 'success',
+                    'record_id': data.get('record_id'),
+                    'data': data,
+                    'duplicate': extraction['duplicate'],
+                    'ocr_ms': extraction['ocr_ms']
+                })
+                destination = PROCESSED_DIR
+            except Exception as e:
+                results.append({'filename': filename, 'status': 'error', 'error': str(e)})
+                destination = FAILED_DIR
+                print(f"Failed {filename}: {e}", flush=True)
+
+            self._move(path, destination, batch_id)
+
+        summary_path = os.path.join(self.output_dir, f"batch_{batch_id}.json")
+        with open(summary_path, 'w') as f:
+            json.dump({'batch_id': batch_id, 'results': results}, f, indent=2)
+
+        ok = sum(1 for result in results if result['status'] == 'success')
+        with self._stats_lock:
+            self.stats['batches'] += 1
+            self.stats['succeeded'] += ok
+            self.stats['failed'] += len(results) - ok
+        print(f"Batch {batch_id}: {ok}/{len(batch)} ok in {time.perf_counter() - started:.1f}s -> {summary_path}",
+              flush=True)
+
+    def _move(self, path, destination, batch_id):
+        """Move a finished file out of the inbox, keeping names unique"""
+        name = os.path.basename(path)
+        target = os.path.join(self.inbox, destination, name)
+        if os.path.exists(target):
+            target = os.path.join(self.inbox, destination, f"{batch_id}_{name}")
+        try:
+            shutil.move(path, target)
+        except OSError as e:
+            print(f"Could not move {name} to {destination}/: {e}", flush=True)
+        finally:
+            with self._claimed_lock:
+                self._claimed.discard(path)
+
+    def _worker(self):
+        """Process queued batches until stopped"""
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                return
+            try:
+                self._process_batch(batch)
+            except Exception as e:
+                print(f"Batch failed: {e}", flush=True)
+
+    def run(self):
+        """Watch the inbox until stop() is called"""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'watch-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        notified = self._start_observer()
+        print(f"Watching {self.inbox} ({'filesystem events' if notified else 'polling'}, "
+              f"{self.workers} worker(s), batches of up to {self.batch_size})", flush=True)
+
+        # Files already waiting when we start are picked up by the first full scan
+        last_full_scan = 0.0
+        try:
+            while not self._stop.is_set():
+                now = time.time()
+                # With notifications a full listing is only a periodic safety net
+                full = not notified or now - last_full_scan >= 30
+                self.scan(full=full)
+                if full:
+                    last_full_scan = now
+
+                ready = self.stable_files()
+                if ready:
+                    with self._claimed_lock:
+                        self._claimed.update(ready)
+                    if not self._pending:
+                        self._pending_since = time.time()
+                    self._pending.extend(ready)
+
+                while self._pending and (len(self._pending) >= self.batch_size
+                                         or time.time() - self._pending_since >= self.batch_wait):
+                    # Not queued means stop() was called while the queue was full
+                    if not self._flush():
+                        break
+
+                self._stop.wait(self.poll_interval)
+        finally:
+            self._shutdown()
+
+    def _shutdown(self):
+        """Queue what is pending, let workers finish their batches and stop the observer"""
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+
+        self._stop.clear()
+        while self._pending:
+            self._flush(force=True)
+        for _ in self._threads:
+            self.batches.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._stop.set()
+        print(f"Watcher stopped: {self.stats['batches']} batch(es), {self.stats['succeeded']} ok, "
+              f"{self.stats['failed']} failed", flush=True)
+
+    def stop(self):
+        """Ask run() to return after the current iteration"""
+        self._stop.set()
+
+
+def main(argv=None):
+    """Run the watcher until interrupted"""
+    from server.config import (EXTRACTION_DB_PATH, OCR_MAX_PAGES,
+                               OCR_STOP_AT_VEHICLE_BLOCK, OCR_DPI, OCR_MAX_IMAGE_PIXELS)
+    from server.data_parser import DataParser
+    from server.ocr_processor import OCRProcessor
+    from server.pipeline import ExtractionPipeline
+    from server.store import ExtractionStore
+
+    parser = argparse.ArgumentParser(
+        prog='python -m server.watcher',
+        description='Process inspection reports as they arrive in a folder.')
+    parser.add_argument('inbox', help='Folder the scanners write into')
+    parser.add_argument('--output', default=None, help='Folder for batch summaries (default INBOX/processed)')
+    parser.add_argument('--workers', type=int, default=2, help='Batches processed at once')
+    parser.add_argument('--batch-size', type=int, default=10, help='Most files per batch')
+    parser.add_argument('--batch-wait', type=float, default=5.0, help='Seconds to wait for a batch to fill')
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help='Seconds a file must stop changing before it is read')
+    parser.add_argument('--poll', type=float, default=1.0, help='Seconds between scans')
+    parser.add_argument('--no-watchdog', action='store_true', help='Always poll, even if watchdog is installed')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.inbox):
+        parser.error(f"Inbox folder not found: {args.inbox}")
+
+    ocr_processor = OCRProcessor(max_pages=OCR_MAX_PAGES, stop_at_vehicle_block=OCR_STOP_AT_VEHICLE_BLOCK,
+                                 dpi=OCR_DPI, max_image_pixels=OCR_MAX_IMAGE_PIXELS)
+    store = ExtractionStore(EXTRACTION_DB_PATH)
+    pipeline = ExtractionPipeline(ocr_processor, DataParser(), store, ocr_slots=max(1, args.workers))
+
+    watcher = FolderWatcher(args.inbox, pipeline, args.output, workers=args.workers,
+                            batch_size=args.batch_size, batch_wait=args.batch_wait,
+                            settle_seconds=args.settle, poll_interval=args.poll,
+                            use_watchdog=not args.no_watchdog)
+
+    # Finish in-flight batches on SIGTERM (e.g. container shutdown) as on Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.exit(main())